@@ -0,0 +1,90 @@
+"""
+搭配看板素材目录（static/textures、static/decor）
+
+原来每次请求 /api/outfits/assets/{asset_type} 都要 listdir 并在 Python 里过滤扩展名。
+这里在启动时为每类素材建一份目录（文件名、字节数、宽高、版本化 URL），
+之后每个请求只 stat 一次目录：目录 mtime 变化（增删 / 重命名文件）时才重建。
+缩略图复用 thumbnails 的多尺寸版本，尚未生成时回退为原图。
+"""
+import os
+import threading
+import time
+
+from PIL import Image
+
+import static_assets
+import thumbnails
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_TYPES = ("textures", "decor")
+ASSET_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# 两次检查目录 mtime 的最小间隔（秒）
+CHECK_INTERVAL_SECONDS = 2.0
+
+
+class AssetCatalog:
+    """单类素材的目录"""
+
+    def __init__(self, asset_type):
+        self.asset_type = asset_type
+        self.directory = os.path.join(BASE_DIR, "static", asset_type)
+        self.entries = []
+        self.dir_mtime_ns = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        entries = []
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith(ASSET_EXTENSIONS):
+                continue
+            path = f"/static/{self.asset_type}/{entry.name}"
+            try:
+                with Image.open(entry.path) as image:
+                    width, height = image.size
+            except OSError:
+                width = height = None
+            entries.append({
+                "name": entry.name,
+                "path": path,
+                "url": static_assets.versioned_url(path),
+                "size": entry.stat().st_size,
+                "width": width,
+                "height": height,
+            })
+            thumbnails.schedule(path)
+        return entries
+
+    def refresh(self, force=False):
+        """目录 mtime 变化时重建；两次检查之间至少间隔 CHECK_INTERVAL_SECONDS"""
+        now = time.monotonic()
+        if not force and now - self.checked_at < CHECK_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            self.checked_at = now
+            try:
+                mtime_ns = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                self.entries, self.dir_mtime_ns = [], None
+                return
+            if force or mtime_ns != self.dir_mtime_ns:
+                self.entries = self._scan()
+                self.dir_mtime_ns = mtime_ns
+
+    def list(self):
+        self.refresh()
+        return self.entries
+
+
+_catalogs = {asset_type: AssetCatalog(asset_type) for asset_type in ASSET_TYPES}
+
+
+def get_catalog(asset_type):
+    """未知的素材类型返回 None（也避免 asset_type 被用来列出任意目录）"""
+    return _catalogs.get(asset_type)
+
+
+def build_all():
+    """启动时调用：建立全部素材目录并提交缩略图生成"""
+    for catalog in _catalogs.values():
+        catalog.refresh(force=True)
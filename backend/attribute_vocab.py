@@ -0,0 +1,306 @@
+"""
+衣物属性词表：颜色、季节的归一化与查找表
+
+颜色、季节都是用户自由填写的字符串（"浅蓝色"、"navy"、"#1e3a8a"、"All"、"四季"……），
+相似度打分和衣橱搜索都需要把它们归一化。这里在导入时一次性建好：
+  - 颜色：英文名 / 中文名（可带“色”后缀和深浅修饰）/ 十六进制色值
+    -> 基础颜色、颜色组位掩码、CIE Lab 坐标；颜色组沿用原 calculate_color_similarity 的分组；
+  - 季节：英文 / 中文写法 -> 季节 id，以及季节相似度矩阵；
+  - Lab 坐标支持向量化计算色差（CIE76 ΔE），十六进制色值按色差归入最近的基础颜色。
+similarity.py（心愿单相似度打分）与 routers/closet.py（搜索过滤）共用本模块。
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# ===================== 颜色 =====================
+# 颜色组（顺序即组 id）
+COLOR_GROUPS = ('red', 'blue', 'green', 'black', 'white', 'gray', 'brown', 'purple', 'pink', 'yellow', 'orange')
+
+# 基础颜色：英文名 -> (sRGB 色值, 所属颜色组, 别名)；beige、coral 同属两个组
+BASE_COLORS = {
+    'red': ('#ff0000', ('red',), ('红', '大红', '正红')),
+    'crimson': ('#dc143c', ('red',), ('绯红',)),
+    'scarlet': ('#ff2400', ('red',), ('猩红',)),
+    'ruby': ('#9b111e', ('red',), ('宝石红',)),
+    'cherry': ('#de3163', ('red',), ('樱桃红',)),
+    'burgundy': ('#800020', ('red',), ('酒红', '枣红')),
+    'blue': ('#0000ff', ('blue',), ('蓝', '宝蓝')),
+    'navy': ('#000080', ('blue',), ('藏青', '藏蓝', '海军蓝', '深蓝')),
+    'sky': ('#87ceeb', ('blue',), ('天蓝', '浅蓝')),
+    'azure': ('#007fff', ('blue',), ('湛蓝',)),
+    'cobalt': ('#0047ab', ('blue',), ('钴蓝',)),
+    'teal': ('#008080', ('blue',), ('青', '孔雀蓝')),
+    'green': ('#008000', ('green',), ('绿',)),
+    'emerald': ('#50c878', ('green',), ('翠绿', '祖母绿')),
+    'olive': ('#808000', ('green',), ('橄榄绿', '军绿')),
+    'lime': ('#32cd32', ('green',), ('草绿', '青柠')),
+    'mint': ('#98ff98', ('green',), ('薄荷绿',)),
+    'forest': ('#228b22', ('green',), ('墨绿', '深绿')),
+    'black': ('#000000', ('black',), ('黑',)),
+    'charcoal': ('#36454f', ('black',), ('炭灰', '炭黑')),
+    'onyx': ('#353839', ('black',), ('玛瑙黑',)),
+    'ebony': ('#555d50', ('black',), ('乌木',)),
+    'white': ('#ffffff', ('white',), ('白', '纯白')),
+    'ivory': ('#fffff0', ('white',), ('象牙白',)),
+    'cream': ('#fffdd0', ('white',), ('奶白', '奶油')),
+    'beige': ('#f5f5dc', ('white', 'brown'), ('米', '米白', '米黄')),
+    'off-white': ('#faf9f6', ('white',), ('本白',)),
+    'gray': ('#808080', ('gray',), ('grey', '灰')),
+    'slate': ('#708090', ('gray',), ('石板灰', '蓝灰')),
+    'silver': ('#c0c0c0', ('gray',), ('银', '白金')),
+    'ash': ('#b2beb5', ('gray',), ('浅灰',)),
+    'brown': ('#8b4513', ('brown',), ('棕', '褐')),
+    'tan': ('#d2b48c', ('brown',), ('卡其', '浅棕', '淡棕')),
+    'chocolate': ('#7b3f00', ('brown',), ('巧克力',)),
+    'coffee': ('#6f4e37', ('brown',), ('咖啡', '咖')),
+    'caramel': ('#c68e17', ('brown',), ('焦糖', '驼', '太妃糖')),
+    'purple': ('#800080', ('purple',), ('紫',)),
+    'violet': ('#8f00ff', ('purple',), ('紫罗兰',)),
+    'lavender': ('#b57edc', ('purple',), ('薰衣草', '淡紫')),
+    'lilac': ('#c8a2c8', ('purple',), ('丁香紫',)),
+    'mauve': ('#e0b0ff', ('purple',), ('藕荷',)),
+    'pink': ('#ffc0cb', ('pink',), ('粉', '粉红')),
+    'rose': ('#ff007f', ('pink',), ('玫红', '玫瑰')),
+    'salmon': ('#fa8072', ('pink',), ('鲑鱼粉',)),
+    'coral': ('#ff7f50', ('pink', 'orange'), ('珊瑚',)),
+    'fuchsia': ('#ff00ff', ('pink',), ('紫红', '桃红')),
+    'yellow': ('#ffff00', ('yellow',), ('黄',)),
+    'gold': ('#ffd700', ('yellow',), ('金', '香槟金')),
+    'amber': ('#ffbf00', ('yellow',), ('琥珀',)),
+    'mustard': ('#ffdb58', ('yellow',), ('芥末黄', '姜黄')),
+    'lemon': ('#fff44f', ('yellow',), ('柠檬黄', '鹅黄')),
+    'orange': ('#ffa500', ('orange',), ('橙', '橘', '橘黄', '橙黄')),
+    'peach': ('#ffe5b4', ('orange',), ('桃', '蜜桃')),
+    'apricot': ('#fbceb1', ('orange',), ('杏',)),
+    'tangerine': ('#f28500', ('orange',), ('橘红',)),
+}
+
+# 深浅修饰词 -> Lab 明度（L*）偏移；修饰后的颜色仍属于原颜色组
+LIGHTNESS_MODIFIERS = {
+    '浅': 15, '淡': 15, '亮': 10, '深': -15, '暗': -15,
+    'light': 15, 'pale': 15, 'bright': 10, 'dark': -15, 'deep': -15,
+}
+
+# 色差不超过该值视为同一种颜色（如 "red" 与 "红色"、"#ff0000"）
+SAME_COLOR_DELTA_E = 5.0
+
+_HEX_PATTERN = re.compile(r'^#?([0-9a-f]{3}|[0-9a-f]{6})$')
+_WORD_SPLIT = re.compile(r'[\s_\-/]+')
+
+
+def hex_to_rgb(value):
+    """'#rgb' / '#rrggbb' -> (r, g, b)，0-255"""
+    value = value.lstrip('#')
+    if len(value) == 3:
+        value = ''.join(ch * 2 for ch in value)
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_lab(rgb):
+    """sRGB（0-255，形状 (..., 3)）-> CIE Lab（D65），向量化"""
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz = xyz / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def delta_e(labs1, labs2):
+    """两组 Lab 坐标两两之间的色差（CIE76），(N, 3) × (M, 3) -> N×M"""
+    labs1 = np.asarray(labs1, dtype=np.float64).reshape(-1, 3)
+    labs2 = np.asarray(labs2, dtype=np.float64).reshape(-1, 3)
+    return np.sqrt(((labs1[:, None, :] - labs2[None, :, :]) ** 2).sum(axis=2))
+
+
+# 导入时建表：基础颜色按 BASE_COLORS 顺序编号
+BASE_COLOR_NAMES = tuple(BASE_COLORS)
+BASE_COLOR_LABS = rgb_to_lab([hex_to_rgb(hex_value) for hex_value, _, _ in BASE_COLORS.values()])
+BASE_COLOR_MASKS = np.array([
+    sum(1 << COLOR_GROUPS.index(group) for group in groups) for _, groups, _ in BASE_COLORS.values()
+], dtype=np.int64)
+
+# 名称 / 别名 -> 基础颜色 id
+COLOR_NAMES = {}
+for _color_id, (_name, (_, _, _aliases)) in enumerate(BASE_COLORS.items()):
+    for _alias in (_name,) + _aliases:
+        COLOR_NAMES[_alias] = _color_id
+
+
+class ColorInfo:
+    """一个颜色字符串的归一化结果"""
+
+    __slots__ = ('color_id', 'group_mask', 'lab')
+
+    def __init__(self, color_id, lab):
+        self.color_id = color_id  # 最接近的基础颜色
+        self.group_mask = int(BASE_COLOR_MASKS[color_id])
+        self.lab = lab  # (L*, a*, b*)
+
+    @property
+    def name(self):
+        return BASE_COLOR_NAMES[self.color_id]
+
+
+def normalize_color(value):
+    """小写、去首尾空白；中文颜色名去掉“色”后缀"""
+    text = (value or '').lower().strip()
+    if len(text) > 1 and text.endswith('色'):
+        text = text[:-1]
+    return text
+
+
+def _named(text, lightness=0):
+    color_id = COLOR_NAMES.get(text)
+    if color_id is None:
+        return None
+    lab = BASE_COLOR_LABS[color_id].copy()
+    lab[0] = min(100.0, max(0.0, lab[0] + lightness))
+    return ColorInfo(color_id, tuple(lab))
+
+
+def _nearest(lab):
+    return int(np.argmin(delta_e(lab, BASE_COLOR_LABS)[0]))
+
+
+@lru_cache(maxsize=4096)
+def resolve_color(value):
+    """
+    颜色字符串 -> ColorInfo，无法识别时返回 None
+    依次尝试：完整名称 / 十六进制色值 / 去掉深浅修饰词 / 结尾的颜色名（"粉蓝" -> 蓝）/ 英文最后一个词
+    结尾颜色名只用于中文复合词：英文单词的结尾恰好是颜色名时（"tartan" -> tan、"splash" -> ash）不是颜色
+    """
+    text = normalize_color(value)
+    if not text:
+        return None
+    info = _named(text)
+    if info is not None:
+        return info
+
+    match = _HEX_PATTERN.match(text)
+    if match:
+        lab = rgb_to_lab(hex_to_rgb(match.group(1)))
+        return ColorInfo(_nearest(lab), tuple(lab))
+
+    words = [word for word in _WORD_SPLIT.split(text) if word]
+    if len(words) > 1:
+        # 英文：light blue / navy blue
+        lightness = sum(LIGHTNESS_MODIFIERS.get(word, 0) for word in words[:-1])
+        return _named(words[-1], lightness)
+
+    for modifier, lightness in LIGHTNESS_MODIFIERS.items():
+        if text.startswith(modifier) and len(text) > len(modifier):
+            info = _named(text[len(modifier):], lightness)
+            if info is not None:
+                return info
+    if text.isascii():
+        return None
+    for start in range(1, len(text)):
+        info = _named(text[start:])
+        if info is not None:
+            return info
+    return None
+
+
+def color_group_mask(value):
+    """颜色所属颜色组的位掩码，无法识别时为 0"""
+    info = resolve_color(value)
+    return info.group_mask if info is not None else 0
+
+
+def color_labs(values):
+    """一组颜色 -> ((N, 3) Lab 坐标, (N,) 是否可识别)，无法识别的行坐标为 0"""
+    labs = np.zeros((len(values), 3), dtype=np.float64)
+    known = np.zeros(len(values), dtype=bool)
+    for row, value in enumerate(values):
+        info = resolve_color(value)
+        if info is not None:
+            labs[row] = info.lab
+            known[row] = True
+    return labs, known
+
+
+def color_aliases(value):
+    """与输入同一种基础颜色的全部写法（英文名 + 别名），用于搜索时展开；无法识别时为空"""
+    info = resolve_color(value)
+    if info is None:
+        return ()
+    name = info.name
+    return (name,) + BASE_COLORS[name][2]
+
+
+@lru_cache(maxsize=1024)
+def color_alias_conflicts(value):
+    """
+    搜索时中文写法按子串匹配，单字写法会命中其它基础颜色（"青" 在 "藏青" 里，"红" 在 "玫红" 里）
+    返回 {中文写法: 包含它的其它基础颜色写法}，写法包括输入本身（去掉“色”后缀）和 color_aliases；
+    没有冲突的写法不出现
+    """
+    info = resolve_color(value)
+    if info is None:
+        return {}
+    terms = {alias for alias in color_aliases(value) if not alias.isascii()}
+    text = normalize_color(value)
+    if text and not text.isascii():
+        terms.add(text)
+    conflicts = {}
+    for term in terms:
+        others = tuple(sorted(
+            name for name, color_id in COLOR_NAMES.items()
+            if color_id != info.color_id and term in name and name != term
+        ))
+        if others:
+            conflicts[term] = others
+    return conflicts
+
+
+# ===================== 季节 =====================
+SEASONS = ('Spring', 'Summer', 'Autumn', 'Winter', 'All Seasons')
+SEASON_IDS = {season: i for i, season in enumerate(SEASONS)}
+ALL_SEASONS_ID = SEASON_IDS['All Seasons']
+
+# 季节 -> 其它写法（匹配时不区分大小写）
+SEASON_ALIASES = {
+    'Spring': ('spring', '春', '春季', '春天'),
+    'Summer': ('summer', '夏', '夏季', '夏天'),
+    'Autumn': ('autumn', 'fall', '秋', '秋季', '秋天'),
+    'Winter': ('winter', '冬', '冬季', '冬天'),
+    'All Seasons': ('all seasons', 'all', 'all season', '四季', '全季', '四季通用'),
+}
+_SEASON_LOOKUP = {}
+for _season, _aliases in SEASON_ALIASES.items():
+    for _alias in (_season.lower(),) + _aliases:
+        _SEASON_LOOKUP[_alias] = SEASON_IDS[_season]
+
+# 季节相似度矩阵，行列顺序同 SEASONS；All Seasons 与任何季节为 0.7
+SEASON_MATRIX = np.array([
+    [1.0, 0.6, 0.4, 0.2, 0.7],
+    [0.6, 1.0, 0.4, 0.2, 0.7],
+    [0.4, 0.4, 1.0, 0.6, 0.7],
+    [0.2, 0.2, 0.6, 1.0, 0.7],
+    [0.7, 0.7, 0.7, 0.7, 1.0],
+])
+
+
+def season_id(value):
+    """季节字符串 -> SEASONS 下标，无法识别时为 -1"""
+    return _SEASON_LOOKUP.get((value or '').lower().strip(), -1)
+
+
+def season_aliases(value):
+    """与输入同一季节的全部写法（小写），用于搜索时展开；无法识别时为空"""
+    sid = season_id(value)
+    if sid < 0:
+        return ()
+    season = SEASONS[sid]
+    return (season.lower(),) + SEASON_ALIASES[season]
@@ -0,0 +1,324 @@
+"""
+衣物批量导入（POST /api/closet/items/bulk 与 scripts/inject_local.py 共用）
+
+逐条导入时每行都要查一次分类、查一次重名、逐个查标签，十万条就是几十万次往返。这里：
+  - 输入支持 JSON 数组（或 {"items": [...]}）/ NDJSON / CSV；
+  - 分类、标签、用户已有单品名称各只查询一次，之后在内存里映射和去重（按名称，与 inject_local 一致）；
+  - 每 BATCH_SIZE 行一条多行 INSERT ... RETURNING 拿回 item_id，
+    搜索倒排行和标签关联在 PostgreSQL / openGauss 上用 COPY 写入，其它数据库用 executemany；
+  - 出错的行不中断导入，逐行返回行号和原因；全部写入在同一个事务里提交。
+"""
+import csv
+import io
+import json
+import os
+import re
+from types import SimpleNamespace
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+
+import models
+import schemas
+import search_index
+import file_store
+import reference_data
+import user_stats
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FORMATS = ("json", "ndjson", "csv")
+# Content-Type / 文件扩展名 -> 格式
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+EXTENSIONS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+BATCH_SIZE = 1000
+# 响应里最多列出的错误 / 警告条数（总数另有统计）
+MAX_REPORTED_ERRORS = 1000
+# 支持 COPY FROM STDIN 的方言
+COPY_DIALECTS = ("postgresql", "opengauss")
+# CSV 中 tags 列的分隔符
+TAG_SEPARATORS = re.compile(r"[|;,，、]")
+# 只给出 filename 时图片所在的目录
+ITEM_IMAGE_DIR = "/static/uploads/items"
+
+ITEM_FIELDS = (
+    "name", "brand", "color", "season", "occasion", "style",
+    "material", "purchase_date", "price", "image_url", "notes",
+)
+
+
+def detect_format(explicit=None, content_type=None, filename=None):
+    """依次按显式参数、Content-Type、文件扩展名确定格式，无法确定时抛出 ValueError"""
+    if explicit:
+        if explicit not in FORMATS:
+            raise ValueError(f"不支持的格式: {explicit}，可选 {' / '.join(FORMATS)}")
+        return explicit
+    if content_type:
+        fmt = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    if filename:
+        fmt = EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+        if fmt:
+            return fmt
+    raise ValueError("无法判断导入格式，请指定 format=json / ndjson / csv")
+
+
+def parse_records(content, fmt):
+    """
+    解析输入，返回 ([(行号, dict), ...], [解析错误])
+    行号从 1 开始：JSON 为数组下标 + 1，NDJSON 为文件行号，CSV 为数据行序号（不含表头）
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+
+    if fmt == "json":
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON 解析失败: {e}")
+        if isinstance(data, dict):
+            data = data.get("items")
+        if not isinstance(data, list):
+            raise ValueError("JSON 需为数组，或包含 items 数组的对象")
+        return list(enumerate(data, 1)), []
+
+    if fmt == "ndjson":
+        records, errors = [], []
+        for row_no, line in enumerate(content.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                records.append((row_no, json.loads(line)))
+            except json.JSONDecodeError as e:
+                errors.append({"row": row_no, "error": f"JSON 解析失败: {e}"})
+        return records, errors
+
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or "name" not in reader.fieldnames:
+            raise ValueError("CSV 缺少表头或 name 列")
+        return [
+            (row_no, {key: (value if value != "" else None) for key, value in row.items() if key})
+            for row_no, row in enumerate(reader, 1)
+        ], []
+
+    raise ValueError(f"不支持的格式: {fmt}")
+
+
+class ReferenceMaps:
+    """分类 / 标签映射（来自 reference_data 缓存）与一次性加载的用户已有单品名称"""
+
+    def __init__(self, db, user_id):
+        reference = reference_data.get(db)
+        self.category_ids = set(reference.categories_by_id)
+        self.categories = {}
+        # 先登记 category_type 再登记 category_name，同名时以类型为准（items.json 的 category 为类型）
+        for category in reference.categories:
+            self.categories.setdefault(category["category_type"].lower(), category["category_id"])
+        for category in reference.categories:
+            self.categories.setdefault(category["category_name"].lower(), category["category_id"])
+
+        self.tags = {tag["tag_name"]: tag["tag_id"] for tag in reference.tags}
+        self.tag_ids = set(reference.tags_by_id)
+        self.existing_names = {
+            name for (name,) in db.query(models.ClothingItem.name).filter(models.ClothingItem.user_id == user_id)
+        }
+
+    def category_id(self, record):
+        value = record.get("category_id")
+        if value is not None:
+            try:
+                category_id = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"category_id 不是整数: {value}")
+            if category_id not in self.category_ids:
+                raise ValueError(f"分类ID {category_id} 不存在")
+            return category_id
+        name = record.get("category")
+        if name is None:
+            raise ValueError("缺少 category 或 category_id")
+        category_id = self.categories.get(str(name).strip().lower())
+        if category_id is None:
+            raise ValueError(f"未知分类: {name}")
+        return category_id
+
+    def tag_ids_for(self, record):
+        """返回 (tag_id 列表, 未知标签列表)；tags 为名称（列表或分隔字符串），tag_ids 为 ID"""
+        tag_ids, unknown = [], []
+        names = record.get("tags") or []
+        if isinstance(names, str):
+            names = [name.strip() for name in TAG_SEPARATORS.split(names) if name.strip()]
+        for name in names:
+            if name in self.tags:
+                tag_ids.append(self.tags[name])
+            else:
+                unknown.append(name)
+        ids = record.get("tag_ids") or []
+        if isinstance(ids, str):
+            ids = [value for value in TAG_SEPARATORS.split(ids) if value.strip()]
+        for value in ids:
+            try:
+                tag_id = int(value)
+            except (TypeError, ValueError):
+                unknown.append(str(value))
+                continue
+            if tag_id in self.tag_ids:
+                tag_ids.append(tag_id)
+            else:
+                unknown.append(str(value))
+        return list(dict.fromkeys(tag_ids)), unknown
+
+
+def _column_lengths():
+    return {
+        field: models.ClothingItem.__table__.c[field].type.length
+        for field in ITEM_FIELDS
+        if getattr(models.ClothingItem.__table__.c[field].type, "length", None)
+    }
+
+
+def _validation_message(error):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+def build_row(record, maps, user_id, defaults=None, lengths=None):
+    """校验一条记录，返回 (clothing_items 行, tag_id 列表, 警告列表)；不合法时抛出 ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("每条记录需为对象")
+    record = {**(defaults or {}), **{key: value for key, value in record.items() if value is not None}}
+    if not record.get("image_url") and record.get("filename"):
+        record["image_url"] = f"{ITEM_IMAGE_DIR}/{record['filename']}"
+
+    values = {field: record.get(field) for field in ITEM_FIELDS}
+    values["category_id"] = maps.category_id(record)
+    try:
+        item = schemas.ClothingItemCreateBase(**values)
+    except ValidationError as e:
+        raise ValueError(_validation_message(e))
+    row = item.dict()
+    if not row["name"] or not row["name"].strip():
+        raise ValueError("name 不能为空")
+    for field, length in (lengths or _column_lengths()).items():
+        if row[field] is not None and len(str(row[field])) > length:
+            raise ValueError(f"{field} 超过 {length} 个字符")
+    row["user_id"] = user_id
+
+    warnings = []
+    tag_ids, unknown = maps.tag_ids_for(record)
+    if unknown:
+        warnings.append(f"未知标签已忽略: {', '.join(unknown)}")
+    image_url = row["image_url"]
+    if image_url and image_url.startswith("/static/") \
+            and not os.path.exists(os.path.join(BASE_DIR, image_url.lstrip("/"))):
+        warnings.append(f"图片缺失: {image_url}")
+    return row, tag_ids, warnings
+
+
+def _copy_rows(db, table, columns, rows):
+    """PostgreSQL / openGauss 上用 COPY FROM STDIN 写入（与 session 同一事务），其它数据库 executemany"""
+    if not rows:
+        return
+    connection = db.connection()
+    if connection.dialect.name not in COPY_DIALECTS:
+        db.execute(table.insert(), rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT 'csv')", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_batch(db, batch):
+    """写入一批 (行, tag_ids)：一条多行 INSERT 拿回 item_id，倒排行与标签关联批量写入"""
+    item_ids = db.execute(
+        insert(models.ClothingItem).returning(models.ClothingItem.item_id, sort_by_parameter_order=True),
+        [row for row, _ in batch]
+    ).scalars().all()
+
+    token_rows, tag_rows = [], []
+    for item_id, (row, tag_ids) in zip(item_ids, batch):
+        token_rows.extend(search_index.build_rows(SimpleNamespace(item_id=item_id, **row)))
+        tag_rows.extend({"item_id": item_id, "tag_id": tag_id} for tag_id in tag_ids)
+    _copy_rows(db, models.ClothingSearchToken.__table__, ("item_id", "field", "token", "user_id", "weight"), token_rows)
+    _copy_rows(db, models.clothing_tags, ("item_id", "tag_id"), tag_rows)
+
+
+def import_items(db, user_id, records, parse_errors=(), defaults=None, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    批量导入衣物并提交（dry_run 时只校验、回滚）
+    :param records, parse_errors: parse_records 的两个返回值
+    :param defaults: 记录缺少某字段时使用的默认值
+    :return: 统计信息 dict；提交后调用方负责刷新进程内缓存、生成缩略图
+    """
+    maps = ReferenceMaps(db, user_id)
+    lengths = _column_lengths()
+    stats = {"total": len(records) + len(parse_errors), "inserted": 0, "skipped": 0,
+             "failed": len(parse_errors), "dry_run": dry_run,
+             "errors": list(parse_errors)[:MAX_REPORTED_ERRORS], "warnings": [], "image_urls": []}
+
+    def report(key, row_no, message):
+        if len(stats[key]) < MAX_REPORTED_ERRORS:
+            stats[key].append({"row": row_no, "error" if key == "errors" else "warning": message})
+
+    seen = set(maps.existing_names)
+    batch = []
+    for row_no, record in records:
+        try:
+            row, tag_ids, warnings = build_row(record, maps, user_id, defaults, lengths)
+        except ValueError as e:
+            stats["failed"] += 1
+            report("errors", row_no, str(e))
+            continue
+        if row["name"] in seen:
+            stats["skipped"] += 1
+            continue
+        seen.add(row["name"])
+        for message in warnings:
+            report("warnings", row_no, message)
+
+        batch.append((row, tag_ids))
+        if len(batch) >= batch_size:
+            if not dry_run:
+                _insert_batch(db, batch)
+            stats["inserted"] += len(batch)
+            stats["image_urls"].extend(row["image_url"] for row, _ in batch if row["image_url"])
+            batch = []
+    if batch:
+        if not dry_run:
+            _insert_batch(db, batch)
+        stats["inserted"] += len(batch)
+        stats["image_urls"].extend(row["image_url"] for row, _ in batch if row["image_url"])
+
+    if dry_run:
+        db.rollback()
+        return stats
+    file_store.retain_many(db, stats["image_urls"])
+    if stats["inserted"]:
+        user_stats.rebuild(db, user_id)
+    db.commit()
+    return stats
+
+
+def summarize(stats):
+    """接口响应：去掉内部使用的图片列表"""
+    return {key: value for key, value in stats.items() if key != "image_urls"}
+
+
+def image_urls(stats):
+    """本次导入涉及的不同图片（用于提交缩略图生成）"""
+    return list(dict.fromkeys(stats["image_urls"]))
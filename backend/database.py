@@ -6,6 +6,7 @@ from sqlalchemy.dialects import registry
 from sqlalchemy.engine import Connection
 import re
 import os
+from configparser import ConfigParser
 from urllib.parse import quote_plus
 
 
@@ -15,21 +16,126 @@ registry.register(
     "OpenGaussDialect_psycopg2"
 )
 
-DB_USER = "cby"
-DB_PASS = "Cby1234#"
+# ===================== 数据库配置 =====================
+# 优先级：环境变量 > db.ini > 默认值
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.ini")
+_parser = ConfigParser(interpolation=None)
+_parser.read(CONFIG_PATH, encoding="utf-8")
+
+
+def _setting(section, key, env, default, cast=str):
+    value = os.environ.get(env)
+    if value is None:
+        value = _parser.get(section, key, fallback=None)
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+DB_USER = _setting("opengauss", "user", "DB_USER", "cby")
+DB_PASS = _setting("opengauss", "password", "DB_PASSWORD", "")
 encoded_password = quote_plus(DB_PASS)
-DB_HOST = "127.0.0.1"
-DB_PORT = "15432"
-DB_NAME = "finalpro_db"
-SQLALCHEMY_DATABASE_URL = f"opengauss://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-print(f"{SQLALCHEMY_DATABASE_URL}")
+DB_HOST = _setting("opengauss", "host", "DB_HOST", "127.0.0.1")
+DB_PORT = _setting("opengauss", "port", "DB_PORT", "15432")
+DB_NAME = _setting("opengauss", "database", "DB_NAME", "finalpro_db")
+# DATABASE_URL 可整体覆盖连接串，例如本地用 PostgreSQL / SQLite 代替 openGauss
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL") or \
+    f"opengauss://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# 连接池：pool_size + max_overflow 应不小于 (worker 数 × 线程池大小) 中真正访问数据库的并发量
+POOL_SIZE = _setting("pool", "pool_size", "DB_POOL_SIZE", 10, int)
+MAX_OVERFLOW = _setting("pool", "max_overflow", "DB_MAX_OVERFLOW", 20, int)
+POOL_TIMEOUT = _setting("pool", "pool_timeout", "DB_POOL_TIMEOUT", 30, int)
+# 借出连接时检查：存活超过 pool_recycle 秒的连接先关闭再新建，避免用到被服务端 / 防火墙按空闲超时断开的连接。
+# 它只按连接年龄判断，不能发现提前被杀掉的连接（数据库重启、kill 会话），这种情况仍需 pre_ping
+POOL_RECYCLE = _setting("pool", "pool_recycle", "DB_POOL_RECYCLE", 1800, int)
+POOL_PRE_PING = _setting("pool", "pre_ping", "DB_POOL_PRE_PING", False, bool)
+# 单条 SQL 超时（毫秒），0 表示不限制；仅对 openGauss / PostgreSQL 生效
+STATEMENT_TIMEOUT_MS = _setting("pool", "statement_timeout_ms", "DB_STATEMENT_TIMEOUT_MS", 0, int)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    echo=True
-)
+# 生产环境不要打开 echo：每条 SQL 都打印到 stdout 会拖慢所有请求
+# 需要排查时设置 DB_ECHO=1；请求级 SQL 统计见 metrics.py
+DB_ECHO = _setting("engine", "echo", "DB_ECHO", False, bool)
+METRICS_ENABLED = _setting("engine", "metrics_enabled", "METRICS_ENABLED", True, bool)
+
+# 运维接口（/metrics、/api/pool/stats，见 ops_access.py）：默认不挂载；开启后只允许 allowed_hosts 中的地址访问，
+# 设置了 token 时还需带上 X-Ops-Token 请求头
+OPS_ENDPOINTS_ENABLED = _setting("ops", "enabled", "OPS_ENDPOINTS_ENABLED", False, bool)
+OPS_ALLOWED_HOSTS = _setting("ops", "allowed_hosts", "OPS_ALLOWED_HOSTS", "127.0.0.1, ::1")
+OPS_TOKEN = _setting("ops", "token", "OPS_TOKEN", "")
+
+# 异步数据库通道（asyncpg），开启后热点只读接口改由 routers/async_router.py 提供
+ASYNC_DB_ENABLED = _setting("engine", "async_enabled", "ASYNC_DB_ENABLED", False, bool)
+
+# 读接口响应缓存（response_cache.py）：memory = 进程内 LRU，redis = 本机 Redis（多 worker 共享），off = 关闭
+RESPONSE_CACHE_BACKEND = _setting("cache", "backend", "RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_REDIS_URL = _setting("cache", "redis_url", "RESPONSE_CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+RESPONSE_CACHE_MAX_ENTRIES = _setting("cache", "max_entries", "RESPONSE_CACHE_MAX_ENTRIES", 2048, int)
+RESPONSE_CACHE_TTL = _setting("cache", "ttl_seconds", "RESPONSE_CACHE_TTL", 300, int)
+
+# 密码哈希（security.py）：bcrypt cost 调整后，已有用户下次登录时透明地按新 cost 重新哈希
+BCRYPT_ROUNDS = _setting("security", "bcrypt_rounds", "BCRYPT_ROUNDS", 12, int)
+# bcrypt 专用线程池大小与排队上限，超过上限的登录 / 注册请求直接返回 503
+PASSWORD_HASH_WORKERS = _setting("security", "hash_workers", "PASSWORD_HASH_WORKERS", 2, int)
+PASSWORD_HASH_MAX_PENDING = _setting("security", "hash_max_pending", "PASSWORD_HASH_MAX_PENDING", 64, int)
+
+
+def _async_url(url):
+    """由同步连接串推导异步驱动连接串：openGauss / PostgreSQL 用 asyncpg，SQLite 用 aiosqlite"""
+    scheme, sep, rest = url.partition("://")
+    if scheme.startswith(("opengauss", "postgresql")):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_url(SQLALCHEMY_DATABASE_URL)
+
+engine_kwargs = {"pool_pre_ping": POOL_PRE_PING, "pool_recycle": POOL_RECYCLE, "echo": DB_ECHO}
+if SQLALCHEMY_DATABASE_URL.startswith(("opengauss", "postgresql")):
+    engine_kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    if STATEMENT_TIMEOUT_MS > 0:
+        engine_kwargs["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_kwargs)
+print(engine.url.render_as_string(hide_password=True))
+
+
+def pool_status():
+    """连接池当前状态与配置，用于按 worker 数调整池大小"""
+    pool = engine.pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pre_ping": POOL_PRE_PING,
+        "statement_timeout_ms": STATEMENT_TIMEOUT_MS,
+    }
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    status["status"] = pool.status()
+    return status
+
+
+def _pool_gauges():
+    status = pool_status()
+    return [
+        (f"db_pool_{name}", f"Connection pool {name}", status[name])
+        for name in ("size", "checkedin", "checkedout", "overflow") if name in status
+    ]
+
+
+if METRICS_ENABLED:
+    import metrics
+    metrics.install_engine_hooks(engine)
+    metrics.register_gauges(_pool_gauges)
 
 
 
@@ -0,0 +1,38 @@
+"""
+异步数据库通道
+
+同步接口在线程池里执行，并发量受线程池大小限制；热点只读接口改为
+AsyncSession + asyncpg 后，等待数据库时不占用线程，可以在同一个事件循环里
+交错处理更多请求。写接口仍走同步 Session（需要维护进程内索引和缓存）。
+连接池参数与同步 engine 共用 db.ini 的 [pool] 配置，两个池的连接数相加
+不要超过数据库的 max_connections。
+"""
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import (
+    ASYNC_DATABASE_URL, DB_ECHO, METRICS_ENABLED, MAX_OVERFLOW, POOL_PRE_PING,
+    POOL_RECYCLE, POOL_SIZE, POOL_TIMEOUT, STATEMENT_TIMEOUT_MS,
+)
+
+async_engine_kwargs = {"pool_pre_ping": POOL_PRE_PING, "pool_recycle": POOL_RECYCLE, "echo": DB_ECHO}
+if ASYNC_DATABASE_URL.startswith("postgresql"):
+    async_engine_kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    if STATEMENT_TIMEOUT_MS > 0:
+        async_engine_kwargs["connect_args"] = {
+            "server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}
+        }
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_kwargs)
+
+if METRICS_ENABLED:
+    import metrics
+    # 游标事件挂在底层同步 engine 上，async 请求同样计入 /metrics
+    metrics.install_engine_hooks(async_engine.sync_engine)
+
+# expire_on_commit=False：提交后访问属性不会再触发隐式 IO（AsyncSession 不支持懒加载）
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,292 @@
+"""
+上传文件的内容寻址存储与引用计数
+
+uploads.save_image 以内容 SHA-256 命名文件，同一张图片重复上传、或 add_to_closet
+复制 image_url 都只对应磁盘上的一个文件。stored_files 表记录每个文件被
+clothing_items / wishlist_items / outfit / sys_user 引用的次数：
+  - 写接口在同一事务里调用 retain / release / replace 增减计数（批量导入用 retain_many）；
+  - 计数归零的文件在事务提交后才删除（回滚则不删），删除前再确认计数仍为 0、
+    且文件在归零之后没有被重新上传（mtime）；
+  - 旧数据（表里还没有记录的文件）第一次被引用 / 释放时，按实际引用数补登记。
+    两个事务同时补登记同一个文件时，后插入的一方主键冲突（在 SAVEPOINT 里，不影响外层事务），
+    改为在对方已提交的记录上加减计数：对方统计的引用数看不到本事务未提交的引用，不会重复计数。
+`python file_store.py gc` 重新统计引用数并回收孤儿文件（默认只回收内容寻址命名的文件）。
+"""
+import argparse
+import os
+import re
+import time
+from collections import Counter
+
+from sqlalchemy import bindparam, delete, event, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+import thumbnails
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 受引用计数管理的目录（URL 路径去掉开头的 /）
+MANAGED_DIRS = ("static/uploads/items", "static/uploads/outfits", "static/avatars")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z]+$")
+# 刚上传、还没被任何记录引用的文件，在这段时间内不会被 gc 回收
+GC_GRACE_SECONDS = 24 * 3600
+
+_PENDING_KEY = "file_store_released"
+
+
+def _reference_columns():
+    return (
+        models.ClothingItem.image_url,
+        models.WishlistItem.image_url,
+        models.Outfit.image_url,
+        models.User.avatar,
+    )
+
+
+def _disk_path(url):
+    return os.path.join(BASE_DIR, url.lstrip("/"))
+
+
+def is_managed(url):
+    """是否为本地上传目录下的文件（外链、装饰素材等不计数）"""
+    if not url or not url.startswith("/static/"):
+        return False
+    return os.path.dirname(url).lstrip("/") in MANAGED_DIRS
+
+
+def count_references(db, url):
+    """数据库中实际引用该文件的记录数（只在补登记旧文件时使用）"""
+    return sum(
+        db.query(func.count()).filter(column == url).scalar()
+        for column in _reference_columns()
+    )
+
+
+def _record_values(url, ref_count):
+    name = os.path.basename(url)
+    path = _disk_path(url)
+    return {
+        "path": url,
+        "sha256": os.path.splitext(name)[0] if HASHED_NAME.match(name) else None,
+        "size": os.path.getsize(path) if os.path.exists(path) else 0,
+        "ref_count": ref_count,
+    }
+
+
+def _register(db, url):
+    """为表中没有记录的文件补登记，计数取当前实际引用数"""
+    record = models.StoredFile(**_record_values(url, count_references(db, url)))
+    db.add(record)
+    db.flush()
+    return record
+
+
+def _increment(db, url, delta):
+    return db.query(models.StoredFile) \
+        .filter(models.StoredFile.path == url) \
+        .update({models.StoredFile.ref_count: models.StoredFile.ref_count + delta}, synchronize_session=False)
+
+
+def _adjust(db, url, delta):
+    """计数加减 delta，返回调整后的计数"""
+    if not _increment(db, url, delta):
+        try:
+            with db.begin_nested():
+                return _register(db, url).ref_count
+        except IntegrityError:
+            # 并发事务已登记（并已提交），它的计数不含本事务的引用，照常加减
+            _increment(db, url, delta)
+    return db.query(models.StoredFile.ref_count).filter(models.StoredFile.path == url).scalar()
+
+
+def retain(db, url):
+    """新增一个引用，需在引用记录写入 session 之后调用"""
+    if is_managed(url):
+        db.flush()
+        _adjust(db, url, 1)
+
+
+def retain_many(db, urls, chunk_size=1000):
+    """
+    批量新增引用（批量导入使用），需在引用记录写入之后调用
+    已登记的文件一次 executemany 加计数；未登记的按实际引用数分组统计后批量登记
+    """
+    counts = Counter(url for url in urls if is_managed(url))
+    if not counts:
+        return
+    db.flush()
+    paths = list(counts)
+    for start in range(0, len(paths), chunk_size):
+        chunk = paths[start:start + chunk_size]
+        existing = {
+            path for (path,) in db.query(models.StoredFile.path).filter(models.StoredFile.path.in_(chunk))
+        }
+        if existing:
+            table = models.StoredFile.__table__
+            db.execute(
+                table.update()
+                .where(table.c.path == bindparam("target"))
+                .values(ref_count=table.c.ref_count + bindparam("delta")),
+                [{"target": path, "delta": counts[path]} for path in existing]
+            )
+
+        missing = [path for path in chunk if path not in existing]
+        if not missing:
+            continue
+        references = Counter()
+        for column in _reference_columns():
+            for url, count in db.query(column, func.count()).filter(column.in_(missing)).group_by(column):
+                references[url] += count
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.StoredFile), [_record_values(url, references[url]) for url in missing])
+        except IntegrityError:
+            # 部分文件被并发事务先登记了，逐个处理
+            for path in missing:
+                _adjust(db, path, counts[path])
+
+
+def release(db, url):
+    """释放一个引用，需在引用记录删除 / 修改之后调用；归零的文件在提交后删除"""
+    if not is_managed(url):
+        return
+    db.flush()
+    if _adjust(db, url, -1) <= 0:
+        db.info.setdefault(_PENDING_KEY, []).append((url, time.time()))
+
+
+def replace(db, old_url, new_url):
+    """记录的图片由 old_url 换成 new_url（任一方可为空）"""
+    if old_url == new_url:
+        return
+    retain(db, new_url)
+    release(db, old_url)
+
+
+def remove_file(url):
+    """删除文件及其缩略图"""
+    path = _disk_path(url)
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"已删除图片: {url}")
+    thumbnails.remove_variants(url)
+
+
+def _unlink_released(session):
+    """事务提交后删除计数归零的文件"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        with session.get_bind().connect() as conn:
+            for url, released_at in pending:
+                count = conn.execute(
+                    select(models.StoredFile.ref_count).where(models.StoredFile.path == url)
+                ).scalar()
+                if count is not None and count > 0:
+                    continue
+                path = _disk_path(url)
+                if os.path.exists(path) and os.path.getmtime(path) >= released_at:
+                    # 归零之后又被重新上传，等待新的引用
+                    continue
+                remove_file(url)
+                conn.execute(delete(models.StoredFile).where(
+                    models.StoredFile.path == url, models.StoredFile.ref_count <= 0
+                ))
+            conn.commit()
+    except Exception as e:
+        print(f"删除图片失败: {e}")
+
+
+def _discard_released(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Session, "after_commit", _unlink_released)
+event.listen(Session, "after_rollback", _discard_released)
+
+
+def collect_garbage(db, grace_seconds=GC_GRACE_SECONDS, include_legacy=False, dry_run=False):
+    """
+    按实际引用重算计数并回收孤儿文件
+    :param include_legacy: 是否也回收非内容寻址命名的旧文件（uuid 命名、示例图片等）
+    :return: 统计信息 dict
+    """
+    references = Counter()
+    for column in _reference_columns():
+        for url, count in db.query(column, func.count()).filter(column.isnot(None)).group_by(column).all():
+            if is_managed(url):
+                references[url] += count
+
+    stats = {"recounted": 0, "removed": 0, "removed_bytes": 0, "kept_legacy": 0, "stale_rows": 0}
+    records = {record.path: record for record in db.query(models.StoredFile).all()}
+    for url, record in records.items():
+        if record.ref_count != references.get(url, 0):
+            record.ref_count = references.get(url, 0)
+            stats["recounted"] += 1
+    for url in references:
+        if url not in records and os.path.exists(_disk_path(url)):
+            records[url] = _register(db, url)
+            stats["recounted"] += 1
+
+    cutoff = time.time() - grace_seconds
+    for directory in MANAGED_DIRS:
+        disk_dir = os.path.join(BASE_DIR, directory)
+        if not os.path.isdir(disk_dir):
+            continue
+        for entry in os.scandir(disk_dir):
+            if not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if entry.name.endswith(".part"):
+                # 上传中断留下的临时文件
+                if mtime < cutoff and not dry_run:
+                    os.remove(entry.path)
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            url = f"/{directory}/{entry.name}"
+            if references.get(url) or mtime >= cutoff:
+                continue
+            if not HASHED_NAME.match(entry.name) and not include_legacy:
+                stats["kept_legacy"] += 1
+                continue
+            stats["removed"] += 1
+            stats["removed_bytes"] += entry.stat().st_size
+            if not dry_run:
+                remove_file(url)
+
+    for url in records:
+        if not references.get(url) and not os.path.exists(_disk_path(url)):
+            stats["stale_rows"] += 1
+            if not dry_run:
+                db.query(models.StoredFile).filter(models.StoredFile.path == url).delete(synchronize_session=False)
+
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return stats
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="上传文件引用计数维护")
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    parser.add_argument("--legacy", action="store_true", help="同时回收非内容寻址命名的旧文件")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_SECONDS / 3600)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        result = collect_garbage(session, args.grace_hours * 3600, args.legacy, args.dry_run)
+    finally:
+        session.close()
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"✅ {prefix}重算计数 {result['recounted']} 个，回收文件 {result['removed']} 个 "
+          f"({result['removed_bytes'] / 1024 / 1024:.1f} MB)，保留旧文件 {result['kept_legacy']} 个，"
+          f"清理记录 {result['stale_rows']} 条")
@@ -0,0 +1,36 @@
+"""
+接口响应的 ETag / 304 协商
+
+内容很少变化、又会被频繁请求的 GET 接口（分类、标签、看板素材）带上 ETag，
+客户端带 If-None-Match 再次请求时，内容未变化直接返回 304，不再传输响应体。
+"""
+import hashlib
+import json
+
+from fastapi import Response
+
+
+def etag_for(payload, *parts):
+    """由可 JSON 序列化的内容（及附加部分）计算强 ETag"""
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def not_modified(request, response, etag, headers=None):
+    """
+    给响应设置 ETag；If-None-Match 命中时返回 304 响应，否则返回 None
+    :param headers: 304 响应也需要带上的其它头（如 X-Total-Count）
+    """
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+    response.headers["ETag"] = etag
+    return None
@@ -1,17 +1,23 @@
 import os
 import logging
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from database import engine, Base
+from database import engine, Base, SessionLocal, METRICS_ENABLED, ASYNC_DB_ENABLED, OPS_ENDPOINTS_ENABLED, pool_status
 from routers.user_router import router as user_router
 from routers.outfit_router import router as outfit_router
 from routers.upload_router import router as upload_router
 from routers import wishlist
 import models
+import metrics
+import ops_access
+import uploads
+import static_assets
+import asset_catalog
+import reference_data
+import user_stats
 from routers import closet
 
 # ===================== 1. 配置日志 =====================
@@ -26,17 +32,26 @@ logger = logging.getLogger("DB-FinalProject")
 
 # ===================== 2. 数据库初始化 =====================
 Base.metadata.create_all(bind=engine)
+# 分类 / 标签参考数据预加载到内存（ORM 写入后自动失效，直接改库则定时重新加载）
+reference_data.preload()
+# 为还没有仪表盘统计行的旧用户补建（只在部署后第一次启动时有工作量）
+with SessionLocal() as _session:
+    user_stats.create_missing(_session)
 
 # ===================== 3. 创建FastAPI应用 =====================
 app = FastAPI(title="DbFinalProject Backend API", debug=True)
 
 # ===================== 4. 跨域中间件 =====================
+# 上传大小限制放在跨域中间件内层，413 响应同样带上 CORS 头
+app.add_middleware(uploads.UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # 允许任何前端端口访问
     allow_credentials=True,
     allow_methods=["*"],  # 允许 GET, POST, PUT, DELETE 等所有方法
     allow_headers=["*"],  # 允许所有 Header
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Server-Timing"],  # 游标分页的下一页游标、素材总数与 ETag、耗时统计
 )
 
 class ForceCORSHeadersMiddleware(BaseHTTPMiddleware):
@@ -46,21 +61,38 @@ class ForceCORSHeadersMiddleware(BaseHTTPMiddleware):
         response.headers["Access-Control-Allow-Credentials"] = "true"
         response.headers["Access-Control-Allow-Methods"] = "*"
         response.headers["Access-Control-Allow-Headers"] = "*"
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor, X-Total-Count, ETag, Server-Timing"
         return response
 
 app.add_middleware(ForceCORSHeadersMiddleware)
 
+# 请求级 SQL 条数 / 耗时统计（最外层，覆盖全部中间件耗时），数据见 /metrics（运维接口，需开启 [ops]）
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # ===================== 5. 静态文件配置 =====================
 if not os.path.exists("static"):
     os.makedirs("static")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_app = static_assets.StaticAssets(directory="static")
+app.mount("/static", static_app, name="static")
+# 最外层：/static 请求直接交给 static_app，不经过跨域 / 统计等中间件
+app.add_middleware(static_assets.StaticBypassMiddleware, static_app=static_app)
+# 搭配看板素材目录（之后按目录 mtime 自动重建）
+asset_catalog.build_all()
 
 # ===================== 6. 注册路由 =====================
+# 异步通道开启时，热点只读接口的 async 版本先注册，同路径请求优先命中
+if ASYNC_DB_ENABLED:
+    from routers import async_router
+    app.include_router(async_router.router)
 app.include_router(user_router)
 app.include_router(closet.router)
 app.include_router(outfit_router)
 app.include_router(wishlist.router)
 app.include_router(upload_router)
+# 运维接口（/metrics、/api/pool/stats）默认不挂载；开启后只允许内网地址（及 X-Ops-Token）访问，见 ops_access.py
+if METRICS_ENABLED and OPS_ENDPOINTS_ENABLED:
+    app.include_router(metrics.router, dependencies=[Depends(ops_access.require_internal)])
 
 
 # ===================== 7. 根路由 =====================
@@ -69,6 +101,13 @@ def read_root():
     return {"message": "Welcome to the DbFinalProject Backend API"}
 
 
+if OPS_ENDPOINTS_ENABLED:
+    @app.get("/api/pool/stats", dependencies=[Depends(ops_access.require_internal)])
+    def get_pool_stats():
+        """数据库连接池状态（已用/空闲/溢出连接数及配置），用于按 worker 数调整池大小；运维接口"""
+        return pool_status()
+
+
 # ===================== 8. 全局异常处理器（核心：捕获422错误并打印详情） =====================
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,197 @@
+"""
+请求级 SQL / 耗时监控
+
+- SQLAlchemy before/after_cursor_execute 钩子统计每条 SQL 的耗时；
+- ASGI 中间件为每个请求建立统计上下文（contextvars，同步接口在线程池中也能继承），
+  请求结束后按 (方法, 路由模板) 累加：请求数、SQL 条数、数据库耗时、总耗时、最慢 SQL；
+- 响应头 Server-Timing 带上本次请求的 db / app 耗时，浏览器开发者工具可直接查看；
+- GET /metrics 以 Prometheus 文本格式导出累计数据（运维接口，[ops] 开启后才挂载，访问控制见 ops_access.py）。
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+MAX_STATEMENT_LABEL_LENGTH = 200
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestStats:
+    """单个请求的统计"""
+
+    __slots__ = ("statements", "db_seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = ""
+
+    def record(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+class RouteStats:
+    """某个路由的累计统计"""
+
+    __slots__ = ("requests", "statements", "db_seconds", "request_seconds",
+                 "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.request_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = ""
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+_gauge_providers = []
+
+
+def register_gauges(provider):
+    """注册额外的 gauge 来源，provider() 返回 [(名称, 说明, 数值), ...]"""
+    _gauge_providers.append(provider)
+
+
+# ===================== SQLAlchemy 钩子 =====================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def install_engine_hooks(engine):
+    """给 engine 挂上 SQL 计时钩子"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ===================== ASGI 中间件 =====================
+def _route_label(scope):
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    # 静态文件等挂载应用没有路由模板，只取第一级路径，避免标签无限增长
+    parts = scope.get("path", "/").split("/")
+    return "/" + parts[1] if len(parts) > 1 and parts[1] else "/"
+
+
+def _record(method, route, stats, request_seconds):
+    key = (method, route)
+    with _routes_lock:
+        route_stats = _routes.get(key)
+        if route_stats is None:
+            route_stats = _routes[key] = RouteStats()
+        route_stats.requests += 1
+        route_stats.statements += stats.statements
+        route_stats.db_seconds += stats.db_seconds
+        route_stats.request_seconds += request_seconds
+        if stats.slowest_seconds > route_stats.slowest_seconds:
+            route_stats.slowest_seconds = stats.slowest_seconds
+            route_stats.slowest_statement = stats.slowest_statement
+
+
+class MetricsMiddleware:
+    """记录每个请求的 SQL 条数、数据库耗时和总耗时，并写入 Server-Timing 响应头"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} queries", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            _record(scope.get("method", ""), _route_label(scope), stats, time.perf_counter() - start)
+
+
+# ===================== Prometheus 导出 =====================
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+
+def render_prometheus():
+    """把累计数据渲染成 Prometheus 文本格式"""
+    with _routes_lock:
+        snapshot = [
+            (key, {name: getattr(route_stats, name) for name in RouteStats.__slots__})
+            for key, route_stats in sorted(_routes.items())
+        ]
+
+    metrics = [
+        ("http_requests_total", "counter", "Total HTTP requests", "requests"),
+        ("http_request_duration_seconds_total", "counter", "Total time spent handling requests", "request_seconds"),
+        ("db_statements_total", "counter", "Total SQL statements executed", "statements"),
+        ("db_duration_seconds_total", "counter", "Total time spent in SQL statements", "db_seconds"),
+    ]
+    lines = []
+    for name, metric_type, help_text, attr in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (method, route), values in snapshot:
+            lines.append(f'{name}{{method="{method}",route="{_escape(route)}"}} {values[attr]}')
+
+    lines.append("# HELP db_slowest_statement_seconds Slowest SQL statement seen per route")
+    lines.append("# TYPE db_slowest_statement_seconds gauge")
+    for (method, route), values in snapshot:
+        statement = _escape(" ".join(values["slowest_statement"].split())[:MAX_STATEMENT_LABEL_LENGTH])
+        lines.append(
+            f'db_slowest_statement_seconds{{method="{method}",route="{_escape(route)}",'
+            f'statement="{statement}"}} {values["slowest_seconds"]}'
+        )
+
+    for provider in _gauge_providers:
+        for name, help_text, value in provider():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 抓取接口"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
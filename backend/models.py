@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, UniqueConstraint, func, Float, Date, Table ,Numeric
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, UniqueConstraint, func, Float, Date, Table ,Numeric, SmallInteger, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -68,6 +68,50 @@ class ClothingItem(Base):
     # 反向关联搭配引用，以便级联删除
     outfit_references = relationship("OutfitRef", back_populates="item", cascade="all, delete-orphan")
 
+    # 游标分页使用的复合索引
+    __table_args__ = (
+        Index('idx_clothing_items_user_created', 'user_id', 'created_at', 'item_id'),
+        Index('idx_clothing_items_user_category_created', 'user_id', 'category_id', 'created_at', 'item_id'),
+    )
+
+class ClothingSearchToken(Base):
+    """衣物搜索倒排表：每个字段的字符 1-gram / 2-gram，由写接口维护"""
+    __tablename__ = 'clothing_search_tokens'
+
+    item_id = Column(Integer, ForeignKey('clothing_items.item_id', ondelete='CASCADE'), primary_key=True)
+    field = Column(String(20), primary_key=True)
+    token = Column(String(8), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    weight = Column(SmallInteger, nullable=False, default=1)
+
+    __table_args__ = (
+        Index('idx_search_tokens_lookup', 'user_id', 'token', 'item_id'),
+    )
+
+class StoredFile(Base):
+    """上传文件引用计数：文件名为内容 SHA-256，相同内容只存一份，引用数归零时才删除"""
+    __tablename__ = 'stored_files'
+
+    path = Column(String(255), primary_key=True)  # URL 路径，如 /static/uploads/items/<sha256>.png
+    sha256 = Column(String(64))
+    size = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserStats(Base):
+    """按用户物化的仪表盘统计：写接口在同一事务里增量维护，读接口一次主键查询（见 user_stats.py）"""
+    __tablename__ = 'user_stats'
+
+    user_id = Column(Integer, ForeignKey('sys_user.user_id', ondelete='CASCADE'), primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0.0)
+    category_counts = Column(Text, nullable=False, default='{}')  # JSON: {category_id: 单品数}
+    recent_item_ids = Column(Text, nullable=False, default='[]')  # JSON: 按购买日期最近的几件单品
+    wishlist_count = Column(Integer, nullable=False, default=0)
+    wishlist_added = Column(Integer, nullable=False, default=0)
+    wishlist_category_counts = Column(Text, nullable=False, default='{}')  # JSON: {category_id: 心愿单数}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Tag(Base):
     __tablename__ = 'tags'
     
@@ -94,6 +138,10 @@ class Outfit(Base):
     items = relationship("OutfitRef", back_populates="outfit", cascade="all, delete-orphan")
     user = relationship("User")
 
+    __table_args__ = (
+        Index('idx_outfit_user_created', 'user_id', 'create_time', 'outfit_id'),
+    )
+
 class OutfitRef(Base):
     __tablename__ = "outfit_ref"
     
@@ -136,3 +184,7 @@ class WishlistItem(Base):
     user = relationship("User", back_populates="wishlist_items")
     category = relationship("Category")
     tags = relationship("Tag", secondary="wishlist_tags", back_populates="wishlist_items")
+
+    __table_args__ = (
+        Index('idx_wishlist_user_created', 'user_id', 'created_at', 'wishlist_id'),
+    )
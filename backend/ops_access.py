@@ -0,0 +1,45 @@
+"""
+运维接口的访问控制
+
+/metrics 暴露 SQL 文本和全部路由、/api/pool/stats 暴露连接池配置，不能和业务接口一样对外开放：
+  - OPS_ENDPOINTS_ENABLED 关闭时（默认）main.py 不挂载这些接口；
+  - 开启后只接受 OPS_ALLOWED_HOSTS 中的客户端地址（默认只有本机），
+    其它地址一律 404，不暴露接口是否存在；
+  - 配置了 OPS_TOKEN 时还要求请求头 X-Ops-Token 与之一致。
+应用部署在反向代理之后时，客户端地址是代理的地址，此时应配置 OPS_TOKEN。
+"""
+import hmac
+import ipaddress
+
+from fastapi import HTTPException, Request, status
+
+from database import OPS_ALLOWED_HOSTS, OPS_TOKEN
+
+
+def _parse_networks(value):
+    networks = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if part:
+            networks.append(ipaddress.ip_network(part, strict=False))
+    return networks
+
+
+ALLOWED_NETWORKS = _parse_networks(OPS_ALLOWED_HOSTS)
+
+
+def is_allowed_host(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in ALLOWED_NETWORKS)
+
+
+def require_internal(request: Request):
+    """运维接口的依赖：非内网地址返回 404，token 不符返回 403"""
+    host = request.client.host if request.client else None
+    if not is_allowed_host(host):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if OPS_TOKEN and not hmac.compare_digest(request.headers.get("x-ops-token", ""), OPS_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无效的运维访问凭据")
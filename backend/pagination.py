@@ -0,0 +1,88 @@
+"""
+游标（keyset）分页工具
+
+列表按 (时间, id) 倒序排列，游标是最后一行排序键的不透明编码，
+下一页用 WHERE (时间, id) < (游标时间, 游标id) 直接在复合索引上定位，
+不再像 OFFSET 那样越往后越慢。
+下一页游标通过响应头 X-Next-Cursor 返回（没有更多数据时不返回），
+原有 skip/limit 参数保持兼容，但传了 cursor 时忽略 skip。
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(*values):
+    """把排序键编码为 URL 安全的字符串"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """解析游标，格式不对时返回 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(cursor)
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def keyset(query, order_columns, limit, skip=0, cursor=None):
+    """
+    给 Query / Select 加上排序、游标条件与 LIMIT（多取一行用于判断是否还有下一页）
+    :param order_columns: 排序键列，如 (ClothingItem.created_at, ClothingItem.item_id)
+    """
+    query = query.order_by(*[column.desc() for column in order_columns])
+    if cursor:
+        values = decode_cursor(cursor, len(order_columns))
+        query = query.filter(tuple_(*order_columns) < tuple_(*values))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+
+def page(rows, limit, response, row_key=None):
+    """截掉多取的一行，并在还有下一页时写入 X-Next-Cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if row_key is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*row_key(rows[-1]))
+    return rows
+
+
+def paginate(query, order_columns, limit, response, skip=0, cursor=None, row_key=None):
+    """
+    按 order_columns 倒序分页（同步 Session.query）
+    :param row_key: 从结果行取排序键值的函数，用于生成下一页游标
+    :return: 当前页的行
+    """
+    rows = keyset(query, order_columns, limit, skip, cursor).all()
+    return page(rows, limit, response, row_key)
+
+
+async def paginate_async(session, stmt, order_columns, limit, response, skip=0, cursor=None,
+                         row_key=None, scalars=True):
+    """paginate 的 AsyncSession + select() 版本"""
+    result = await session.execute(keyset(stmt, order_columns, limit, skip, cursor))
+    rows = result.scalars().all() if scalars else result.all()
+    return page(rows, limit, response, row_key)
@@ -0,0 +1,43 @@
+"""
+查询形状（加载策略）配置
+
+各接口按返回结构选择一个 profile，关联数据用 joinedload / selectinload
+预先取出，避免在序列化时对每一行懒加载 category / tags（N+1 查询）。
+每个 profile 产生的查询条数是常数，与返回行数无关：
+  - joinedload：多对一关联（category），并入主查询，0 条额外查询
+  - selectinload：一对多 / 多对多（tags），额外 1 条 IN 查询
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+import models
+
+PROFILES = {
+    # schemas.ClothingItem：衣物 + 分类 + 标签
+    "item_card": (
+        joinedload(models.ClothingItem.category),
+        selectinload(models.ClothingItem.tags),
+    ),
+    # 只需要分类名的衣物（搭配详情、相似推荐）
+    "item_with_category": (
+        joinedload(models.ClothingItem.category),
+    ),
+    # schemas.WishlistItemWithTags：心愿单 + 分类 + 标签
+    "wishlist_card": (
+        joinedload(models.WishlistItem.category),
+        selectinload(models.WishlistItem.tags),
+    ),
+}
+
+# 左侧单品栏只需要的列（显式投影，不加载整行）
+ITEM_SUMMARY_COLUMNS = (
+    models.ClothingItem.item_id,
+    models.ClothingItem.name,
+    models.ClothingItem.image_url,
+    models.Category.category_type,
+    models.Category.category_name,
+)
+
+
+def shaped(query, profile):
+    """给查询套上某个加载策略"""
+    return query.options(*PROFILES[profile])
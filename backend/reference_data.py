@@ -0,0 +1,142 @@
+"""
+分类 / 标签参考数据的进程内缓存
+
+categories、tags 两张表只有几十行且几乎不变，却被分类列表、创建衣物 / 心愿单、
+批量导入、统计接口和前端下拉框反复查询。这里：
+  - 启动时（main.py）整表加载到内存，之后读接口直接使用内存中的快照；
+  - 每次加载得到一个新快照，内容变化时版本号加一，ETag 由内容哈希得出（多进程之间一致）；
+  - 通过 ORM 对象（session.add / 修改 / delete）写入 Category / Tag 时提交后自动失效；
+    批量 UPDATE / DELETE 或直接改库（init.sql、reset_db.py）
+    的情况由 REFRESH_SECONDS 兜底，也可以调用 invalidate()。
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models
+import http_cache
+
+REFRESH_SECONDS = 300
+
+_PENDING_KEY = "reference_data_dirty"
+
+
+class Snapshot:
+    """某一时刻的分类 / 标签数据（只读）"""
+
+    def __init__(self, categories, tags, version):
+        self.categories = categories  # [{category_id, category_name, category_type}]，按 category_id 排序
+        self.tags = tags  # [{tag_id, tag_name, tag_type}]，按 tag_id 排序
+        self.categories_by_id = {category["category_id"]: category for category in categories}
+        self.tags_by_id = {tag["tag_id"]: tag for tag in tags}
+        self.version = version
+        self.tags_etag = http_cache.etag_for(tags)
+        self.loaded_at = time.monotonic()
+
+    def is_expired(self):
+        return time.monotonic() - self.loaded_at > REFRESH_SECONDS
+
+
+_snapshot = None
+_version = 0
+_lock = threading.Lock()
+
+
+def load(db):
+    """从数据库加载一个新快照"""
+    global _snapshot, _version
+    categories = [
+        {"category_id": category_id, "category_name": category_name, "category_type": category_type}
+        for category_id, category_name, category_type in db.query(
+            models.Category.category_id, models.Category.category_name, models.Category.category_type
+        ).order_by(models.Category.category_id)
+    ]
+    tags = [
+        {"tag_id": tag_id, "tag_name": tag_name, "tag_type": tag_type}
+        for tag_id, tag_name, tag_type in db.query(
+            models.Tag.tag_id, models.Tag.tag_name, models.Tag.tag_type
+        ).order_by(models.Tag.tag_id)
+    ]
+    with _lock:
+        previous = _snapshot
+        changed = previous is None or previous.categories != categories or previous.tags != tags
+        if changed:
+            _version += 1
+        _snapshot = Snapshot(categories, tags, _version)
+        return _snapshot
+
+
+def current():
+    """当前有效的快照，不存在或已过期时返回 None（异步接口据此决定是否加载）"""
+    snapshot = _snapshot
+    if snapshot is None or snapshot.is_expired():
+        return None
+    return snapshot
+
+
+def get(db):
+    """当前快照，不存在或超过 REFRESH_SECONDS 时重新加载"""
+    return current() or load(db)
+
+
+def preload():
+    """启动时调用；数据库不可用时只打印错误，首次请求时再加载"""
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        snapshot = load(session)
+        print(f"✅ 参考数据已加载：{len(snapshot.categories)} 个分类，{len(snapshot.tags)} 个标签")
+    except Exception as e:
+        print(f"⚠️ 参考数据加载失败: {e}")
+    finally:
+        session.close()
+
+
+def invalidate():
+    """丢弃快照，下次访问时重新加载"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def categories(db):
+    return get(db).categories
+
+
+def category(db, category_id):
+    """按 ID 取分类，不存在时返回 None"""
+    return get(db).categories_by_id.get(category_id)
+
+
+def tags(db):
+    return get(db).tags
+
+
+def tags_by_id(db):
+    return get(db).tags_by_id
+
+
+# ORM 写入分类 / 标签时标记，提交后失效（回滚不影响）
+def _mark_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_PENDING_KEY] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop(_PENDING_KEY, False):
+        invalidate()
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+for _model in (models.Category, models.Tag):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _mark_dirty)
+event.listen(Session, "after_commit", _invalidate_after_commit)
+event.listen(Session, "after_rollback", _discard_after_rollback)
@@ -0,0 +1,266 @@
+"""
+读接口的响应缓存（按用户失效）
+
+衣橱 / 心愿单 / 搭配页面每次切换都会请求分类、单品、仪表盘、心愿单和搭配列表，
+而这些数据只有当前用户自己写入时才会变化。这里把这些 GET 接口序列化后的响应体缓存起来：
+  - 键 = 用户 + 路径 + 排序后的查询参数 + 所依赖数据范围（closet / wishlist / outfits）的代数；
+  - closet.py / wishlist.py / outfit_router.py 的写接口提交后调用 bump()，
+    该用户对应范围的代数加一，旧条目不再命中，由 LRU / TTL 自然淘汰；
+  - 响应带 ETag（响应体哈希），客户端带 If-None-Match 且内容未变化时返回 304；
+  - 后端可选 memory（进程内 LRU）或 redis（本机 Redis，多 worker 共享代数和条目，
+    需要安装 redis 包），在 db.ini [cache] 或环境变量中配置，off 时只保留 ETag 协商。
+绕过写接口直接改库（inject_local.py、init.sql、分类 / 标签表）的情况由 TTL 兜底。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import http_cache
+from database import (
+    RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_REDIS_URL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL,
+    METRICS_ENABLED,
+)
+
+try:
+    import redis
+except ImportError:  # 可选依赖，只有 backend = redis 时需要
+    redis = None
+
+# 数据范围：写接口按范围失效，读接口声明自己依赖哪些范围
+SCOPES = ("closet", "wishlist", "outfits")
+
+KEY_PREFIX = "resp"
+# 缓存命中时随响应返回的头（分页游标、总数等），其它头由中间件重新生成
+CACHED_HEADERS = ("x-next-cursor", "x-total-count")
+
+
+# ===================== 后端 =====================
+class MemoryBackend:
+    """进程内 LRU；代数单独保存，不参与淘汰（否则代数被淘汰后归零可能命中旧条目）"""
+
+    name = "memory"
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (过期时间, entry)
+        self._generations = {}  # (user_id, scope) -> 代数
+        self._lock = threading.Lock()
+
+    def generations(self, user_id, scopes):
+        with self._lock:
+            return [self._generations.get((user_id, scope), 0) for scope in scopes]
+
+    def bump(self, user_id, scopes):
+        with self._lock:
+            for scope in scopes:
+                self._generations[(user_id, scope)] = self._generations.get((user_id, scope), 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            if cached[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class RedisBackend:
+    """本机 Redis（或兼容协议的服务）：条目用 SET EX 保存，代数用 INCR；多个 worker 之间共享"""
+
+    name = "redis"
+
+    def __init__(self, url=RESPONSE_CACHE_REDIS_URL, ttl=RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2)
+
+    @staticmethod
+    def _generation_key(user_id, scope):
+        return f"{KEY_PREFIX}:gen:{user_id}:{scope}"
+
+    def generations(self, user_id, scopes):
+        values = self._client.mget([self._generation_key(user_id, scope) for scope in scopes])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, user_id, scopes):
+        pipe = self._client.pipeline(transaction=False)
+        for scope in scopes:
+            pipe.incr(self._generation_key(user_id, scope))
+        pipe.execute()
+
+    def get(self, key):
+        raw = self._client.get(key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry["body"] = entry["body"].encode("utf-8")
+        return entry
+
+    def set(self, key, entry):
+        raw = json.dumps({**entry, "body": entry["body"].decode("utf-8")}, ensure_ascii=False)
+        self._client.set(key, raw, ex=self.ttl)
+
+    def size(self):
+        return None
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{KEY_PREFIX}:*"):
+            self._client.delete(key)
+
+
+def _create_backend():
+    name = (RESPONSE_CACHE_BACKEND or "").strip().lower()
+    if name == "off":
+        return None
+    if name == "redis":
+        if redis is None:
+            print("⚠️ 响应缓存配置为 redis，但未安装 redis 包，改用进程内缓存")
+        else:
+            return RedisBackend()
+    return MemoryBackend()
+
+
+backend = _create_backend()
+
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+
+def _count(name):
+    _stats[name] += 1
+
+
+# ===================== 读接口 =====================
+def cache_key(request, user_id, scopes, generations):
+    """用户 + 路径 + 排序后的查询参数 + 各范围代数"""
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    versions = ".".join(str(generation) for generation in generations)
+    raw = f"{request.url.path}?{params}"
+    return f"{KEY_PREFIX}:{user_id}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}:{versions}"
+
+
+def _cached_response(request, entry):
+    headers = {"ETag": entry["etag"], **entry["headers"]}
+    if http_cache.etag_matches(request, entry["etag"]):
+        _count("not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+def lookup(request, user_id, scopes):
+    """
+    读接口开头调用
+    :param scopes: 响应依赖的数据范围，如 ("closet",)
+    :return: (缓存键, 命中时的响应)；未命中时响应为 None，处理完后把键交给 store()
+    """
+    if backend is None:
+        return None, None
+    try:
+        key = cache_key(request, user_id, scopes, backend.generations(user_id, scopes))
+        entry = backend.get(key)
+    except Exception as e:
+        # 缓存服务不可用时直接查库，不影响接口
+        _count("errors")
+        print(f"⚠️ 响应缓存读取失败: {e}")
+        return None, None
+    if entry is None:
+        _count("misses")
+        return key, None
+    _count("hits")
+    return key, _cached_response(request, entry)
+
+
+_adapters = {}
+
+
+def _serialize(result, model):
+    """与 FastAPI 按 response_model 序列化的结果一致"""
+    if model is not None:
+        adapter = _adapters.get(model)
+        if adapter is None:
+            adapter = _adapters[model] = TypeAdapter(model)
+        result = adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def store(request, response, key, result, model=None, cacheable=True):
+    """
+    序列化响应体、写入缓存并返回响应（带 ETag，If-None-Match 命中时为 304）
+    :param response: 接口注入的 Response，其中的分页头会一起缓存
+    :param model: 接口的 response_model，没有时按 jsonable_encoder 序列化
+    :param cacheable: 为 False 时只返回不写入，用于含有临时内容的响应
+        （例如缩略图还在生成、image_variants 暂时回退为原图；生成完成不会触发 bump）
+    """
+    body = _serialize(result, model)
+    entry = {
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "headers": {name: value for name, value in response.headers.items() if name in CACHED_HEADERS},
+        "body": body,
+    }
+    if key is not None and cacheable:
+        try:
+            backend.set(key, entry)
+        except Exception as e:
+            _count("errors")
+            print(f"⚠️ 响应缓存写入失败: {e}")
+    return _cached_response(request, entry)
+
+
+# ===================== 写接口 =====================
+def bump(user_id, *scopes):
+    """写接口提交成功后调用，使该用户依赖这些范围的缓存全部失效"""
+    if backend is None:
+        return
+    try:
+        backend.bump(user_id, scopes)
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ 响应缓存失效失败（旧条目在 TTL 后过期）: {e}")
+
+
+def clear():
+    if backend is not None:
+        backend.clear()
+
+
+def stats():
+    size = backend.size() if backend is not None else 0
+    return {"backend": backend.name if backend is not None else "off", "entries": size, **_stats}
+
+
+def _gauges():
+    current = stats()
+    return [
+        (f"response_cache_{name}", f"Response cache {name}", current[name])
+        for name in ("hits", "misses", "not_modified", "errors", "entries") if current[name] is not None
+    ]
+
+
+if METRICS_ENABLED:
+    import metrics
+    metrics.register_gauges(_gauges)
@@ -0,0 +1,319 @@
+"""
+热点只读接口的异步版本（AsyncSession）
+
+路径、参数和返回结构与同步版本完全一致，main.py 在 ASYNC_DB_ENABLED 时
+把本路由注册在同步路由之前，同路径请求优先由这里处理；关闭时完全不注册。
+查询条件 / 加载策略 / 分页与同步版本共用 build_search_filters、
+search_index.ranking_subquery、query_profiles 和 pagination；
+响应缓存（response_cache）的键只由路径和参数决定，与同步版本共用缓存条目。
+image_variants 需要检查磁盘上的缩略图，放到线程池里计算，不阻塞事件循环。
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from database_async import get_async_db
+import models
+import schemas
+import security
+import search_index
+import pagination
+import query_profiles
+import thumbnails
+import user_stats
+import reference_data
+import response_cache
+from routers.closet import build_search_filters
+
+router = APIRouter(tags=["async"])
+
+
+# ==========================================
+# 衣橱
+# ==========================================
+async def _reference(db: AsyncSession):
+    """参考数据快照；需要（重新）加载时通过 run_sync 用同步 Session 查询"""
+    return reference_data.current() or await db.run_sync(reference_data.load)
+
+
+@router.get("/api/closet/categories", response_model=List[schemas.Category])
+async def get_categories(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """获取所有分类，Item数量只统计当前用户的"""
+    cache_key, cached = response_cache.lookup(request, user_id, ("closet",))
+    if cached is not None:
+        return cached
+
+    snapshot = await _reference(db)
+    # 单品数来自物化的 user_stats 行；还没有统计行的用户用一条 GROUP BY 统计
+    stats = await db.get(models.UserStats, user_id)
+    if stats is not None:
+        counts = user_stats.closet_summary(stats)[2]
+    else:
+        rows = await db.execute(
+            select(models.ClothingItem.category_id, func.count(models.ClothingItem.item_id))
+            .where(models.ClothingItem.user_id == user_id)
+            .group_by(models.ClothingItem.category_id)
+        )
+        counts = dict(rows.all())
+    result = [
+        {**category, "item_count": counts.get(category["category_id"], 0)}
+        for category in snapshot.categories
+    ]
+    return response_cache.store(request, response, cache_key, result, List[schemas.Category])
+
+
+@router.get("/api/closet/category/{category_id}", response_model=schemas.CategoryWithClothes)
+async def get_category_with_clothes(
+    category_id: int,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """获取分类下的衣物 (仅限当前用户)"""
+    category = (await _reference(db)).categories_by_id.get(category_id)
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    stmt = query_profiles.shaped(select(models.ClothingItem), "item_card").where(
+        models.ClothingItem.category_id == category_id,
+        models.ClothingItem.user_id == user_id
+    )
+    clothes = await pagination.paginate_async(
+        db, stmt,
+        (models.ClothingItem.created_at, models.ClothingItem.item_id),
+        limit, response, skip=skip, cursor=cursor,
+        row_key=lambda item: (item.created_at, item.item_id)
+    )
+    return {**category, "clothes": await run_in_threadpool(thumbnails.attach_variants, clothes)}
+
+
+@router.get("/api/closet/items/search", response_model=List[schemas.ClothingItem])
+async def search_items(
+    response: Response,
+    query: Optional[str] = Query(None),
+    category_id: Optional[int] = Query(None),
+    color: Optional[str] = Query(None),
+    season: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """搜索衣物 (仅限当前用户)"""
+    try:
+        filters = build_search_filters(query, category_id, color, season)
+        ranking = search_index.ranking_subquery(user_id, query) if query else None
+
+        if ranking is not None:
+            stmt = query_profiles.shaped(select(models.ClothingItem, ranking.c.score), "item_card") \
+                .join(ranking, ranking.c.item_id == models.ClothingItem.item_id) \
+                .where(models.ClothingItem.user_id == user_id, *filters)
+            rows = await pagination.paginate_async(
+                db, stmt, (ranking.c.score, models.ClothingItem.item_id),
+                limit, response, skip=skip, cursor=cursor,
+                row_key=lambda row: (int(row[1]), row[0].item_id), scalars=False
+            )
+            return await run_in_threadpool(thumbnails.attach_variants, [item for item, _ in rows])
+
+        stmt = query_profiles.shaped(select(models.ClothingItem), "item_card") \
+            .where(models.ClothingItem.user_id == user_id, *filters) \
+            .distinct()
+        items = await pagination.paginate_async(
+            db, stmt, (models.ClothingItem.created_at, models.ClothingItem.item_id),
+            limit, response, skip=skip, cursor=cursor,
+            row_key=lambda item: (item.created_at, item.item_id)
+        )
+        return await run_in_threadpool(thumbnails.attach_variants, items)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"搜索失败：{str(e)}，关键词：{query}，用户ID：{user_id}")
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+
+
+# ==========================================
+# 心愿单
+# ==========================================
+@router.get("/api/wishlist/items", response_model=List[schemas.WishlistItemWithTags])
+async def get_wishlist_items(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
+    added_to_closet: Optional[bool] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """获取用户的心愿单列表"""
+    try:
+        cache_key, cached = response_cache.lookup(request, user_id, ("wishlist",))
+        if cached is not None:
+            return cached
+
+        stmt = query_profiles.shaped(select(models.WishlistItem), "wishlist_card") \
+            .where(models.WishlistItem.user_id == user_id)
+        if added_to_closet is not None:
+            stmt = stmt.where(models.WishlistItem.added_to_closet == added_to_closet)
+
+        items = await pagination.paginate_async(
+            db, stmt,
+            (models.WishlistItem.created_at, models.WishlistItem.wishlist_id),
+            limit, response, skip=skip, cursor=cursor,
+            row_key=lambda item: (item.created_at, item.wishlist_id)
+        )
+        return response_cache.store(request, response, cache_key, items, List[schemas.WishlistItemWithTags])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取心愿单失败: {str(e)}")
+
+
+# ==========================================
+# 搭配（/items 必须注册在 /{outfit_id} 之前）
+# ==========================================
+@router.get("/api/outfits/items")
+async def get_user_items(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """获取当前用户衣橱中所有的单品列表（OutfitStudio 左侧）"""
+    cache_key, cached = response_cache.lookup(request, user_id, ("closet",))
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(*query_profiles.ITEM_SUMMARY_COLUMNS)
+        .join(models.Category, models.ClothingItem.category_id == models.Category.category_id)
+        .where(models.ClothingItem.user_id == user_id)
+    )
+    rows = result.all()
+    image_urls = [row[2] for row in rows]
+    variants = await run_in_threadpool(thumbnails.variant_urls_many, image_urls)
+    pending = await run_in_threadpool(thumbnails.any_pending, image_urls)
+    items = [
+        {
+            "item_id": item_id,
+            "name": name,
+            "image_url": image_url,
+            "image_variants": variants.get(image_url),
+            "category": (cat_type if cat_type else "Other").capitalize(),
+            "original_category": cat_name
+        }
+        for item_id, name, image_url, cat_type, cat_name in rows
+    ]
+    return response_cache.store(request, response, cache_key, items, cacheable=not pending)
+
+
+@router.get("/api/outfits/", response_model=List[schemas.OutfitOut])
+async def list_outfits(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="不传则返回全部搭配"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    cache_key, cached = response_cache.lookup(request, user_id, ("outfits", "closet"))
+    if cached is not None:
+        return cached
+
+    stmt = (
+        select(models.Outfit, func.count(models.OutfitRef.item_id).label("item_count"))
+        .where(models.Outfit.user_id == user_id)
+        .outerjoin(models.OutfitRef)
+        .group_by(models.Outfit.outfit_id)
+    )
+    order_columns = (models.Outfit.create_time, models.Outfit.outfit_id)
+    if limit is None and cursor is None:
+        # 兼容旧前端：不分页，返回全部
+        result = await db.execute(stmt.order_by(*[c.desc() for c in order_columns]).offset(skip))
+        rows = result.all()
+    else:
+        rows = await pagination.paginate_async(
+            db, stmt, order_columns, limit or 20, response, skip=skip, cursor=cursor,
+            row_key=lambda row: (row[0].create_time, row[0].outfit_id), scalars=False
+        )
+
+    image_urls = [outfit.image_url for outfit, _ in rows]
+    variants = await run_in_threadpool(thumbnails.variant_urls_many, image_urls)
+    pending = await run_in_threadpool(thumbnails.any_pending, image_urls)
+    outfits = [
+        schemas.OutfitOut(
+            outfit_id=outfit.outfit_id,
+            name=outfit.name,
+            season=outfit.season,
+            style=outfit.style,
+            image_url=outfit.image_url,
+            image_variants=variants.get(outfit.image_url),
+            create_time=outfit.create_time,
+            item_count=item_count
+        )
+        for outfit, item_count in rows
+    ]
+    return response_cache.store(request, response, cache_key, outfits, List[schemas.OutfitOut],
+                                cacheable=not pending)
+
+
+@router.get("/api/outfits/{outfit_id}", response_model=schemas.OutfitDetailOut)
+async def get_outfit_detail(
+    outfit_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    outfit = (await db.execute(
+        select(models.Outfit).where(models.Outfit.outfit_id == outfit_id, models.Outfit.user_id == user_id)
+    )).scalar_one_or_none()
+    if not outfit:
+        raise HTTPException(status_code=404, detail="找不到该搭配")
+
+    result = await db.execute(
+        query_profiles.shaped(select(models.ClothingItem, models.OutfitRef), "item_with_category")
+        .join(models.OutfitRef, models.OutfitRef.item_id == models.ClothingItem.item_id)
+        .where(models.OutfitRef.outfit_id == outfit_id)
+        .order_by(models.OutfitRef.z_index.asc())
+    )
+
+    items_list = [
+        schemas.OutfitItemDetailOut(
+            item_id=item.item_id,
+            name=item.name,
+            category=item.category.category_name if item.category else "Uncategorized",
+            image_url=item.image_url,
+            position_x=ref.position_x,
+            position_y=ref.position_y,
+            rotation=ref.rotation,
+            scale_x=ref.scale_x,
+            scale_y=ref.scale_y,
+            z_index=ref.z_index,
+        )
+        for item, ref in result.all()
+    ]
+
+    return schemas.OutfitDetailOut(
+        outfit_id=outfit.outfit_id,
+        name=outfit.name,
+        description=outfit.description,
+        season=outfit.season,
+        style=outfit.style,
+        image_url=outfit.image_url,
+        create_time=outfit.create_time,
+        meta_data=outfit.meta_data,
+        items=items_list
+    )
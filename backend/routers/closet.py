@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import and_, func, not_, or_
 from typing import List, Optional
 from database import get_db
 import models, schemas
 import security
+import similarity_index
+import attribute_vocab
+import search_index
+import pagination
+import query_profiles
+import file_store
+import thumbnails
+import bulk_import
+import tag_links
+import reference_data
+import http_cache
+import user_stats
+import response_cache
 import re
 
 router = APIRouter(
@@ -25,124 +39,206 @@ def build_chinese_search_filter(field, keyword):
     # 用 concat 减少 % 前缀（若有索引可走索引扫描），中文用 like 兼容
     return field.like(f"%{keyword}%")
 
+def build_alias_filter(field, keyword, aliases, conflicts=None):
+    """
+    颜色 / 季节过滤：关键词本身模糊匹配，再加上词表中的同义写法
+    （"red" 同时匹配 "红色"，"All Seasons" 同时匹配 "All"、"四季"）；
+    中文别名按子串匹配（"蓝" 匹配 "蓝色"、"粉蓝"），英文别名按整个取值不区分大小写匹配，避免 "tan" 匹配 "tangerine"
+    :param conflicts: {写法: 需要排除的其它写法}，子串匹配时排除属于其它颜色的写法（"青" 不匹配 "藏青"）
+    """
+    conflicts = conflicts or {}
+
+    def exclude(condition, term):
+        excluded = conflicts.get(term)
+        if not excluded:
+            return condition
+        return and_(condition, *[not_(field.like(f"%{other}%")) for other in excluded])
+
+    conditions = []
+    keyword_filter = build_chinese_search_filter(field, keyword)
+    if keyword_filter is not None:
+        conditions.append(exclude(keyword_filter, re.sub(r'\s+', '', keyword)))
+    words = [alias for alias in aliases if alias.isascii()]
+    if words:
+        conditions.append(func.lower(field).in_(words))
+    conditions.extend(exclude(field.like(f"%{alias}%"), alias) for alias in aliases if not alias.isascii())
+    return or_(*conditions) if conditions else None
+
+
+def build_search_filters(query, category_id, color, season):
+    """构建搜索过滤条件列表（同步 / 异步搜索接口共用）"""
+    filters = []
+
+    if query and query.strip():
+        search_conditions = []
+        # 名称（核心字段）
+        name_filter = build_chinese_search_filter(models.ClothingItem.name, query)
+        if name_filter is not None:
+            search_conditions.append(name_filter)
+        # 品牌
+        brand_filter = build_chinese_search_filter(models.ClothingItem.brand, query)
+        if brand_filter is not None:
+            search_conditions.append(brand_filter)
+        # 颜色
+        color_filter = build_chinese_search_filter(models.ClothingItem.color, query)
+        if color_filter is not None:
+            search_conditions.append(color_filter)
+        # 季节
+        season_filter = build_chinese_search_filter(models.ClothingItem.season, query)
+        if season_filter is not None:
+            search_conditions.append(season_filter)
+        # 风格
+        style_filter = build_chinese_search_filter(models.ClothingItem.style, query)
+        if style_filter is not None:
+            search_conditions.append(style_filter)
+        # 场景
+        occasion_filter = build_chinese_search_filter(models.ClothingItem.occasion, query)
+        if occasion_filter is not None:
+            search_conditions.append(occasion_filter)
+
+        if search_conditions:
+            filters.append(or_(*search_conditions))
+
+        # 分类过滤
+    if category_id:
+        filters.append(models.ClothingItem.category_id == category_id)
+
+        # 颜色过滤
+    if color and color.strip():
+        aliases = attribute_vocab.color_aliases(color)
+        keyword = color
+        if aliases and not color.strip().isascii():
+            # "红色" 按 "红" 匹配，才能用上 "红" 的排除列表（否则 "玫红色" 也包含 "红色"）
+            keyword = attribute_vocab.normalize_color(color)
+        color_filter = build_alias_filter(models.ClothingItem.color, keyword, aliases,
+                                          attribute_vocab.color_alias_conflicts(color))
+        if color_filter is not None:
+            filters.append(color_filter)
+
+        # 季节过滤
+    if season and season.strip():
+        season_filter = build_alias_filter(models.ClothingItem.season, season, attribute_vocab.season_aliases(season))
+        if season_filter is not None:
+            filters.append(season_filter)
+
+    return filters
+
 @router.get("/categories", response_model=List[schemas.Category])
 def get_categories(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user_id: int = Depends(security.get_current_user_id) # 需登录
 ):
     """获取所有分类，Item数量只统计当前用户的"""
-    categories = db.query(models.Category).all()
-    result = []
-    for category in categories:
-        count = db.query(func.count(models.ClothingItem.item_id))\
-                 .filter(
-                     models.ClothingItem.category_id == category.category_id,
-                     models.ClothingItem.user_id == user_id 
-                 ).scalar()
-        category_dict = category.__dict__
-        category_dict['item_count'] = count
-        result.append(category_dict)
-    return result
+    cache_key, cached = response_cache.lookup(request, user_id, ("closet",))
+    if cached is not None:
+        return cached
+    # 分类来自 reference_data 内存快照；单品数来自物化的 user_stats 行（一次主键查询，
+    # 与仪表盘饼图同一份数据，各 worker 一致）
+    counts = user_stats.closet_summary(user_stats.get(db, user_id))[2]
+    result = [
+        {**category, "item_count": counts.get(category["category_id"], 0)}
+        for category in reference_data.categories(db)
+    ]
+    return response_cache.store(request, response, cache_key, result, List[schemas.Category])
+
+@router.get("/tags", response_model=List[schemas.Tag])
+def get_tags(
+    request: Request,
+    response: Response,
+    tag_type: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """获取全部标签（前端下拉框），可按 tag_type 过滤"""
+    snapshot = reference_data.get(db)
+    if tag_type is None:
+        etag, result = snapshot.tags_etag, snapshot.tags
+    else:
+        result = [tag for tag in snapshot.tags if tag["tag_type"] == tag_type]
+        etag = http_cache.etag_for(result)
+    return http_cache.not_modified(request, response, etag) or result
 
 @router.get("/category/{category_id}", response_model=schemas.CategoryWithClothes)
 def get_category_with_clothes(
     category_id: int,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
     db: Session = Depends(get_db),
     user_id: int = Depends(security.get_current_user_id)
 ):
     """获取分类下的衣物 (仅限当前用户)"""
-    category = db.query(models.Category).filter(models.Category.category_id == category_id).first()
+    category = reference_data.category(db, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    clothes = db.query(models.ClothingItem)\
+    clothes_query = query_profiles.shaped(db.query(models.ClothingItem), "item_card")\
                 .filter(
                     models.ClothingItem.category_id == category_id,
                     models.ClothingItem.user_id == user_id
-                )\
-                .offset(skip)\
-                .limit(limit)\
-                .all()
+                )
+    clothes = pagination.paginate(
+        clothes_query,
+        (models.ClothingItem.created_at, models.ClothingItem.item_id),
+        limit, response, skip=skip, cursor=cursor,
+        row_key=lambda item: (item.created_at, item.item_id)
+    )
     
-    result = category.__dict__
-    result['clothes'] = clothes
-    return result
+    return {**category, "clothes": thumbnails.attach_variants(clothes)}
 
 @router.get("/items/search", response_model=List[schemas.ClothingItem])
 def search_items(
+    response: Response,
     query: Optional[str] = Query(None),
     category_id: Optional[int] = Query(None),
     color: Optional[str] = Query(None),
     season: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, le=100),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
     db: Session = Depends(get_db),
     user_id: int = Depends(security.get_current_user_id)
 ):
     """搜索衣物 (仅限当前用户)"""
     try:
-        query_obj = db.query(models.ClothingItem).filter(models.ClothingItem.user_id == user_id)
-
-        filters = []
-
-        if query and query.strip():
-            search_conditions = []
-            # 名称（核心字段）
-            name_filter = build_chinese_search_filter(models.ClothingItem.name, query)
-            if name_filter:
-                search_conditions.append(name_filter)
-            # 品牌
-            brand_filter = build_chinese_search_filter(models.ClothingItem.brand, query)
-            if brand_filter:
-                search_conditions.append(brand_filter)
-            # 颜色
-            color_filter = build_chinese_search_filter(models.ClothingItem.color, query)
-            if color_filter:
-                search_conditions.append(color_filter)
-            # 季节
-            season_filter = build_chinese_search_filter(models.ClothingItem.season, query)
-            if season_filter:
-                search_conditions.append(season_filter)
-            # 风格
-            style_filter = build_chinese_search_filter(models.ClothingItem.style, query)
-            if style_filter:
-                search_conditions.append(style_filter)
-            # 场景
-            occasion_filter = build_chinese_search_filter(models.ClothingItem.occasion, query)
-            if occasion_filter:
-                search_conditions.append(occasion_filter)
-
-            if search_conditions:
-                filters.append(or_(*search_conditions))
-
-            # 分类过滤
-        if category_id:
-            filters.append(models.ClothingItem.category_id == category_id)
-
-            # 颜色过滤
-        if color and color.strip():
-            color_filter = build_chinese_search_filter(models.ClothingItem.color, color)
-            if color_filter:
-                filters.append(color_filter)
-
-            # 季节过滤
-        if season and season.strip():
-            season_filter = build_chinese_search_filter(models.ClothingItem.season, season)
-            if season_filter:
-                filters.append(season_filter)
+        query_obj = query_profiles.shaped(db.query(models.ClothingItem), "item_card").filter(models.ClothingItem.user_id == user_id)
+
+        # 关键词先走 clothing_search_tokens 倒排索引召回并计算相关度，
+        # 下面的 LIKE 条件只在召回的候选行上复核
+        ranking = search_index.ranking_subquery(user_id, query) if query else None
+        if ranking is not None:
+            query_obj = query_profiles.shaped(db.query(models.ClothingItem, ranking.c.score), "item_card")\
+                .filter(models.ClothingItem.user_id == user_id)\
+                .join(ranking, ranking.c.item_id == models.ClothingItem.item_id)
+
+        filters = build_search_filters(query, category_id, color, season)
 
             # 应用所有过滤条件（优化：避免空filter导致全表扫描）
         if filters:
             query_obj = query_obj.filter(*filters)
 
-            # - distinct() 去重（按需保留，若无重复可删除）
-            # - 先分页再查询，减少数据加载
-        items = query_obj.distinct().offset(skip).limit(limit).all()
-
-        return items
-
+            # - 有关键词时按 (相关度, item_id) 排序（倒排子查询每件衣物只有一行，无需去重）
+            # - 否则按 (created_at, item_id) 排序，distinct() 去重
+            # - 游标分页，先分页再查询，减少数据加载
+        if ranking is not None:
+            rows = pagination.paginate(
+                query_obj, (ranking.c.score, models.ClothingItem.item_id),
+                limit, response, skip=skip, cursor=cursor,
+                row_key=lambda row: (int(row[1]), row[0].item_id)
+            )
+            return thumbnails.attach_variants([item for item, _ in rows])
+
+        return thumbnails.attach_variants(pagination.paginate(
+            query_obj.distinct(), (models.ClothingItem.created_at, models.ClothingItem.item_id),
+            limit, response, skip=skip, cursor=cursor,
+            row_key=lambda item: (item.created_at, item.item_id)
+        ))
+
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         error_detail = f"搜索失败：{str(e)}，关键词：{query}，用户ID：{user_id}"
@@ -156,14 +252,14 @@ def get_item(
     user_id: int = Depends(security.get_current_user_id)
 ):
     """获取衣物详情 (需验证归属权)"""
-    item = db.query(models.ClothingItem)\
+    item = query_profiles.shaped(db.query(models.ClothingItem), "item_card")\
              .filter(
                  models.ClothingItem.item_id == item_id,
                  models.ClothingItem.user_id == user_id
              ).first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+    return thumbnails.attach_variants([item])[0]
 
 @router.post("/items", response_model=schemas.ClothingItem)
 def create_item(
@@ -179,32 +275,75 @@ def create_item(
         
         tag_ids = item_data.pop('tag_ids', [])
 
-        category = db.query(models.Category).filter(models.Category.category_id == item_data['category_id']).first()
-        if not category:
+        if not reference_data.category(db, item_data['category_id']):
             raise HTTPException(status_code=404, detail=f"分类ID {item_data['category_id']} 不存在")
 
         db_item = models.ClothingItem(**item_data)
         db.add(db_item)
         db.flush()
+        search_index.index_item(db, db_item)
+        file_store.retain(db, db_item.image_url)
 
         if tag_ids:
-            for tag_id in tag_ids:
-                tag = db.query(models.Tag).filter(models.Tag.tag_id == tag_id).first()
-                if tag:
-                    db.execute(
-                        models.clothing_tags.insert().values(
-                            item_id=db_item.item_id,
-                            tag_id=tag_id
-                        )
-                    )
+            tag_links.set_tags(db, "clothing", db_item.item_id, tag_ids, is_new=True)
+        user_stats.closet_changed(db, user_id, after=user_stats.item_state(db_item))
 
         db.commit()
         db.refresh(db_item)
-        return db_item
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"创建衣物失败: {str(e)}")
 
+    # 提交之后的缓存维护：都是尽力而为，不会让已提交的写入返回 500
+    response_cache.bump(user_id, "closet")
+    similarity_index.on_item_saved(db_item)
+    return thumbnails.attach_variants([db_item])[0]
+
+@router.post("/items/bulk")
+async def bulk_import_items(
+    request: Request,
+    format: Optional[str] = Query(None, description="json / ndjson / csv，不传则按 Content-Type 或上传文件名判断"),
+    dry_run: bool = Query(False, description="只校验不写入"),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(security.get_current_user_id)
+):
+    """
+    批量导入衣物：请求体为 JSON / NDJSON / CSV，或 multipart 上传的 file 字段
+    出错的行不影响其它行，响应中逐行列出行号和原因
+    """
+    content_type = request.headers.get("content-type", "")
+    filename = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="缺少 file 字段")
+        filename, content_type = upload.filename, upload.content_type
+        content = await upload.read()
+    else:
+        content = await request.body()
+
+    try:
+        fmt = bulk_import.detect_format(format, content_type, filename)
+        records, parse_errors = await run_in_threadpool(bulk_import.parse_records, content, fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        stats = await run_in_threadpool(
+            bulk_import.import_items, db, user_id, records, parse_errors, dry_run=dry_run
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量导入失败: {str(e)}")
+
+    if not dry_run and stats["inserted"]:
+        response_cache.bump(user_id, "closet")
+        similarity_index.invalidate(user_id)
+        for image_url in bulk_import.image_urls(stats):
+            thumbnails.schedule(image_url)
+    return bulk_import.summarize(stats)
+
 @router.put("/items/{item_id}", response_model=schemas.ClothingItem)
 def update_item(
     item_id: int, 
@@ -215,28 +354,36 @@ def update_item(
     """更新衣物"""
     db_item = db.query(models.ClothingItem)\
                 .filter(models.ClothingItem.item_id == item_id, models.ClothingItem.user_id == user_id)\
+                .with_for_update()\
                 .first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
 
+    # 行已加锁：并发修改同一件衣物时排队执行，old_state 不会过期，统计增量不会重复计入
+    old_image_url = db_item.image_url
+    old_state = user_stats.item_state(db_item)
     try:
         update_data = item_update.dict(exclude={'tag_ids', 'user_id'})
         for key, value in update_data.items():
             setattr(db_item, key, value)
+        search_index.index_item(db, db_item)
+        file_store.replace(db, old_image_url, db_item.image_url)
 
         if item_update.tag_ids is not None:
-            db.execute(models.clothing_tags.delete().where(models.clothing_tags.c.item_id == item_id))
-            for tag_id in item_update.tag_ids:
-                db.execute(models.clothing_tags.insert().values(item_id=item_id, tag_id=tag_id))
+            tag_links.set_tags(db, "clothing", item_id, item_update.tag_ids)
+        user_stats.closet_changed(db, user_id, before=old_state, after=user_stats.item_state(db_item))
 
         db.commit()
         db.refresh(db_item)
-        return db_item
     except Exception as e:
         db.rollback()
         print(f"更新失败：{str(e)}")
         raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
 
+    response_cache.bump(user_id, "closet")
+    similarity_index.on_item_saved(db_item)
+    return thumbnails.attach_variants([db_item])[0]
+
 @router.delete("/items/{item_id}")
 def delete_item(
     item_id: int, 
@@ -246,52 +393,68 @@ def delete_item(
     """删除衣物"""
     db_item = db.query(models.ClothingItem)\
                 .filter(models.ClothingItem.item_id == item_id, models.ClothingItem.user_id == user_id)\
+                .with_for_update()\
                 .first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     
+    image_url = db_item.image_url
+    old_state = user_stats.item_state(db_item)
+    search_index.remove_item(db, item_id)
     db.delete(db_item)
+    file_store.release(db, image_url)
+    user_stats.closet_changed(db, user_id, before=old_state)
     db.commit()
+    response_cache.bump(user_id, "closet")
+    similarity_index.on_item_deleted(user_id, item_id)
     return {"message": "Item deleted successfully"}
 
 
 
 @router.get("/dashboard/stats")
 def get_dashboard_stats(
+        request: Request,
+        response: Response,
         db: Session = Depends(get_db),
         user_id: int = Depends(security.get_current_user_id)
 ):
     """获取仪表盘所需的统计数据：总数、总价、分类占比、最近单品"""
+    cache_key, cached = response_cache.lookup(request, user_id, ("closet",))
+    if cached is not None:
+        return cached
 
-    # 基础统计 (单品总数 + 总金额)
-    base_stats = db.query(
-        func.count(models.ClothingItem.item_id).label("count"),
-        func.sum(models.ClothingItem.price).label("total_price")
-    ).filter(models.ClothingItem.user_id == user_id).first()
-
-    total_count = base_stats.count or 0
-    total_price = base_stats.total_price or 0.0
+    # 统计来自物化的 user_stats 行（一次主键查询），由写接口增量维护
+    total_count, total_price, counts, recent_ids = user_stats.closet_summary(user_stats.get(db, user_id))
 
     # 分类占比 (按 category_name 分组)
-    # 注意：这里只统计有衣服的分类
-    cat_stats = db.query(
-        models.Category.category_name,
-        func.count(models.ClothingItem.item_id).label("count")
-    ).join(models.ClothingItem, models.Category.category_id == models.ClothingItem.category_id) \
-        .filter(models.ClothingItem.user_id == user_id) \
-        .group_by(models.Category.category_name).all()
-
-    pie_data = [{"name": c.category_name, "value": c.count} for c in cat_stats]
-
-    # 最近添加的 4 件单品
-    recent_items = db.query(models.ClothingItem) \
-        .filter(models.ClothingItem.user_id == user_id) \
-        .order_by(models.ClothingItem.purchase_date.desc()) \
-        .limit(4).all()
-
-    return {
+    # 注意：这里只统计有衣服的分类；分类名称来自 reference_data，不再联表
+    category_names = {category["category_id"]: category["category_name"] for category in reference_data.categories(db)}
+    cat_stats = {}
+    for category_id, count in counts.items():
+        name = category_names.get(category_id)
+        if name is not None and count > 0:
+            cat_stats[name] = cat_stats.get(name, 0) + count
+
+    pie_data = [{"name": name, "value": count} for name, count in cat_stats.items()]
+
+    # 最近添加的 4 件单品（ID 列表已按购买日期排好序）
+    recent_items = []
+    if recent_ids:
+        items_by_id = {
+            item.item_id: item
+            for item in query_profiles.shaped(db.query(models.ClothingItem), "item_card")
+            .filter(models.ClothingItem.item_id.in_(recent_ids))
+        }
+        recent_items = thumbnails.attach_variants(
+            [items_by_id[item_id] for item_id in recent_ids if item_id in items_by_id]
+        )
+
+    result = {
         "total_count": total_count,
         "total_price": total_price,
         "category_data": pie_data,
         "recent_items": recent_items
-    }
\ No newline at end of file
+    }
+    # 最近单品的缩略图还在生成时不缓存
+    pending = thumbnails.any_pending(item.image_url for item in recent_items)
+    return response_cache.store(request, response, cache_key, result, cacheable=not pending)
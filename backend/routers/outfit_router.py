@@ -1,24 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-import os
-
+from sqlalchemy import func, insert, update
+from typing import List, Optional
 from database import get_db
 import models
 import schemas
 import security
+import pagination
+import query_profiles
+import thumbnails
+import file_store
+import asset_catalog
+import http_cache
+import response_cache
 
 router = APIRouter(
     prefix="/api/outfits",
     tags=["Outfits & Items"],
 )
 
+ASSET_TOTAL_HEADER = "X-Total-Count"
+
 # ==========================================
 # 获取用户的单品列表 (OutfitStudio 左侧)
 # ==========================================
 @router.get("/items")
 def get_user_items(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user_id: int = Depends(security.get_current_user_id)
 ):
@@ -27,28 +36,88 @@ def get_user_items(
     前端 OutfitBoard.vue 需要根据 category 分组 ('Top', 'Bottom' 等)。
     因此我们这里最好把 category_type 或者 category_name 返回去。
     """
-    # 联表查询：ClothingItem + Category
+    cache_key, cached = response_cache.lookup(request, user_id, ("closet",))
+    if cached is not None:
+        return cached
+
+    # 联表查询：ClothingItem + Category，只投影需要的列
     items = (
-        db.query(models.ClothingItem, models.Category.category_type, models.Category.category_name)
+        db.query(*query_profiles.ITEM_SUMMARY_COLUMNS)
         .join(models.Category, models.ClothingItem.category_id == models.Category.category_id)
         .filter(models.ClothingItem.user_id == user_id)
         .all()
     )
 
     result = []
-    for item, cat_type, cat_name in items:
+    for item_id, name, image_url, cat_type, cat_name in items:
         raw_cat = cat_type if cat_type else "Other"
         display_cat = raw_cat.capitalize()
         
         result.append({
-            "item_id": item.item_id,
-            "name": item.name,
-            "image_url": item.image_url,
+            "item_id": item_id,
+            "name": name,
+            "image_url": image_url,
+            "image_variants": thumbnails.variant_urls(image_url),
             "category": display_cat,
             "original_category": cat_name
         })
 
-    return result
+    # 刚上传的图片缩略图还没生成完时不缓存，否则网格会一直加载原图直到缓存过期
+    pending = thumbnails.any_pending(item["image_url"] for item in result)
+    return response_cache.store(request, response, cache_key, result, cacheable=not pending)
+
+# ==========================================
+# 搭配中单品的布局 (outfit_ref)
+# ==========================================
+# 单品在画布上的变换字段，更新时逐项比较，只写有变化的引用
+REF_LAYOUT_FIELDS = ("position_x", "position_y", "rotation", "scale_x", "scale_y", "z_index")
+
+def _layout_rows(outfit_id: int, items: List[schemas.OutfitItemCreate]):
+    """请求中的单品列表 -> {item_id: 行数据}；同一单品出现多次时以最后一次为准"""
+    return {
+        item_data.item_id: {
+            "outfit_id": outfit_id,
+            "item_id": item_data.item_id,
+            **{field: getattr(item_data, field) for field in REF_LAYOUT_FIELDS},
+        }
+        for item_data in items
+    }
+
+def save_outfit_refs(db: Session, outfit_id: int, items: List[schemas.OutfitItemCreate], is_new: bool = False):
+    """
+    写入搭配的单品布局（不提交，由调用方在同一事务里提交）
+    新增的引用一次批量 INSERT；更新时与已保存的布局比较，
+    只删除被移除的单品、批量 UPDATE 变换有变化的单品，未变化的不写
+    """
+    rows = _layout_rows(outfit_id, items)
+    stored = {}
+    if not is_new:
+        stored = {
+            item_id: layout
+            for item_id, *layout in db.query(
+                models.OutfitRef.item_id,
+                *[getattr(models.OutfitRef, field) for field in REF_LAYOUT_FIELDS]
+            ).filter(models.OutfitRef.outfit_id == outfit_id)
+        }
+
+    removed = [item_id for item_id in stored if item_id not in rows]
+    if removed:
+        db.query(models.OutfitRef).filter(
+            models.OutfitRef.outfit_id == outfit_id,
+            models.OutfitRef.item_id.in_(removed)
+        ).delete(synchronize_session=False)
+
+    added = [row for item_id, row in rows.items() if item_id not in stored]
+    if added:
+        db.execute(insert(models.OutfitRef), added)
+
+    changed = [
+        row for item_id, row in rows.items()
+        if item_id in stored and tuple(row[field] for field in REF_LAYOUT_FIELDS) != tuple(stored[item_id])
+    ]
+    if changed:
+        # 按主键 (outfit_id, item_id) 批量更新
+        db.execute(update(models.OutfitRef), changed)
 
 # ==========================================
 # 创建/保存一个搭配
@@ -75,42 +144,22 @@ def create_outfit(
         meta_data=outfit_data.meta_data
     )
     db.add(new_outfit)
+    # flush 拿到 outfit_id，搭配和单品布局在同一个事务里提交
+    db.flush()
+    outfit_id = new_outfit.outfit_id
+    file_store.retain(db, new_outfit.image_url)
+    save_outfit_refs(db, outfit_id, outfit_data.items, is_new=True)
     db.commit()
-    db.refresh(new_outfit)
-    
-    outfit_refs = []
-    for item_data in outfit_data.items:
-        outfit_ref = models.OutfitRef(
-            outfit_id=new_outfit.outfit_id,
-            item_id=item_data.item_id,
-            position_x=item_data.position_x,
-            position_y=item_data.position_y,
-            rotation=item_data.rotation,
-            scale_x=item_data.scale_x,
-            scale_y=item_data.scale_y,
-            z_index=item_data.z_index,
-        )
-        outfit_refs.append(outfit_ref)
-    
-    db.add_all(outfit_refs)
-    db.commit()
+    response_cache.bump(user_id, "outfits")
     
-    return {"message": "搭配创建成功", "outfit_id": new_outfit.outfit_id}
+    return {"message": "搭配创建成功", "outfit_id": outfit_id}
 
-def delete_local_file(image_url: str):
-    if not image_url:
-        return
-    
-    # 只处理本地 static 目录下的文件
-    if image_url.startswith("/static/"):
-        try:
-            file_path = image_url.lstrip("/")
-            
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"已删除旧图片: {file_path}")
-        except Exception as e:
-            print(f"删除图片失败: {e}")
+def delete_local_file(db: Session, image_url: str):
+    """
+    释放图片的一个引用（需在记录已删除 / 已改用新图之后调用）
+    图片按内容去重、可能被多条记录共用，只有最后一个引用消失时，文件才会在提交后删除
+    """
+    file_store.release(db, image_url)
 
 @router.put("/{outfit_id}")
 def update_outfit(
@@ -124,10 +173,11 @@ def update_outfit(
     if not outfit:
         raise HTTPException(status_code=404, detail="Outfit not found")
 
-    if outfit_update.image_url is not None:
-        if outfit.image_url and outfit.image_url != outfit_update.image_url:
-            delete_local_file(outfit.image_url)
+    if outfit_update.image_url is not None and outfit.image_url != outfit_update.image_url:
+        old_image_url = outfit.image_url
         outfit.image_url = outfit_update.image_url
+        file_store.retain(db, outfit.image_url)
+        delete_local_file(db, old_image_url)
 
     # 更新基础字段
     if outfit_update.name is not None: outfit.name = outfit_update.name
@@ -136,40 +186,33 @@ def update_outfit(
     if outfit_update.style is not None: outfit.style = outfit_update.style
     if outfit_update.meta_data is not None: outfit.meta_data = outfit_update.meta_data
 
-    # 更新关联 Items (先删后加策略，最简单)
+    # 更新关联 Items：与已保存的布局比较，只写变化的部分
     if outfit_update.items is not None:
-        # 删除旧引用
-        db.query(models.OutfitRef).filter(models.OutfitRef.outfit_id == outfit_id).delete()
-        
-        # 添加新引用
-        new_refs = []
-        for item_data in outfit_update.items:
-            ref = models.OutfitRef(
-                outfit_id=outfit_id,
-                item_id=item_data.item_id,
-                position_x=item_data.position_x,
-                position_y=item_data.position_y,
-                rotation=item_data.rotation,
-                scale_x=item_data.scale_x,
-                scale_y=item_data.scale_y,
-                z_index=item_data.z_index,
-            )
-            new_refs.append(ref)
-        db.add_all(new_refs)
+        save_outfit_refs(db, outfit_id, outfit_update.items)
 
     db.commit()
-    db.refresh(outfit)
-    return {"message": "Updated successfully", "outfit_id": outfit.outfit_id}
+    response_cache.bump(user_id, "outfits")
+    return {"message": "Updated successfully", "outfit_id": outfit_id}
 
 # ==========================================
 # 获取用户所有搭配列表
 # ==========================================
 @router.get("/", response_model=List[schemas.OutfitOut])
 def list_outfits(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="不传则返回全部搭配"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页响应头 X-Next-Cursor 的值"),
     db: Session = Depends(get_db),
     user_id: int = Depends(security.get_current_user_id)
 ):
-    outfits_with_count = (
+    # 单品被删除时搭配的单品数也会变化，因此同时依赖 closet 范围
+    cache_key, cached = response_cache.lookup(request, user_id, ("outfits", "closet"))
+    if cached is not None:
+        return cached
+
+    outfits_query = (
         db.query(
             models.Outfit, 
             func.count(models.OutfitRef.item_id).label("item_count")
@@ -177,9 +220,16 @@ def list_outfits(
         .filter(models.Outfit.user_id == user_id)
         .outerjoin(models.OutfitRef)
         .group_by(models.Outfit.outfit_id)
-        .order_by(models.Outfit.create_time.desc())
-        .all()
     )
+    order_columns = (models.Outfit.create_time, models.Outfit.outfit_id)
+    if limit is None and cursor is None:
+        # 兼容旧前端：不分页，返回全部
+        outfits_with_count = outfits_query.order_by(*[c.desc() for c in order_columns]).offset(skip).all()
+    else:
+        outfits_with_count = pagination.paginate(
+            outfits_query, order_columns, limit or 20, response, skip=skip, cursor=cursor,
+            row_key=lambda row: (row[0].create_time, row[0].outfit_id)
+        )
     
     outfit_list = []
     for outfit, item_count in outfits_with_count:
@@ -189,12 +239,15 @@ def list_outfits(
             season=outfit.season,
             style=outfit.style,
             image_url=outfit.image_url,
+            image_variants=thumbnails.variant_urls(outfit.image_url),
             create_time=outfit.create_time,
             item_count=item_count
         )
         outfit_list.append(outfit_data)
         
-    return outfit_list
+    pending = thumbnails.any_pending(outfit.image_url for outfit in outfit_list)
+    return response_cache.store(request, response, cache_key, outfit_list, List[schemas.OutfitOut],
+                                cacheable=not pending)
 
 # ==========================================
 # 获取搭配详情
@@ -215,7 +268,7 @@ def get_outfit_detail(
         raise HTTPException(status_code=404, detail="找不到该搭配")
 
     outfit_items_query = (
-        db.query(models.ClothingItem, models.OutfitRef)
+        query_profiles.shaped(db.query(models.ClothingItem, models.OutfitRef), "item_with_category")
         .join(models.OutfitRef, models.OutfitRef.item_id == models.ClothingItem.item_id)
         .filter(models.OutfitRef.outfit_id == outfit_id)
         .order_by(models.OutfitRef.z_index.asc()) 
@@ -261,32 +314,46 @@ def delete_outfit(
     outfit = db.query(models.Outfit).filter(models.Outfit.outfit_id == outfit_id, models.Outfit.user_id == user_id).first()
     if not outfit:
         raise HTTPException(status_code=404, detail="Not Found")
-    if outfit.image_url:
-        delete_local_file(outfit.image_url)
+    image_url = outfit.image_url
     db.delete(outfit)
+    delete_local_file(db, image_url)
     db.commit()
+    response_cache.bump(user_id, "outfits")
     return
 
 @router.get("/assets/{asset_type}")
-def get_assets(asset_type: str):
+def get_assets(
+    asset_type: str,
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="不传则返回全部素材"),
+):
     """
     asset_type 可以是 'textures' 或 'decor'
+    素材目录在启动时建立、目录变化时重建；响应带 ETag，列表未变化时返回 304
     """
-    base_url = "http://localhost:8000/static"
-    folder_path = os.path.join("static", asset_type)
-    
-    if not os.path.exists(folder_path):
+    catalog = asset_catalog.get_catalog(asset_type)
+    if catalog is None:
         return []
-        
-    files = os.listdir(folder_path)
-    # 过滤图片文件
-    images = [f for f in files if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    
-    # 返回完整的 URL 列表
-    return [
+
+    entries = catalog.list()
+    response.headers[ASSET_TOTAL_HEADER] = str(len(entries))
+    page = entries[skip:skip + limit] if limit is not None else entries[skip:]
+
+    # URL 跟随请求的 host，不再写死 localhost
+    base_url = str(request.base_url).rstrip("/")
+    result = [
         {
-            "name": img,
-            "src": f"{base_url}/{asset_type}/{img}"
+            "name": entry["name"],
+            "src": base_url + entry["url"],
+            "thumbnail": base_url + thumbnails.variant_urls(entry["path"])["thumb"],
+            "width": entry["width"],
+            "height": entry["height"],
+            "size": entry["size"],
         }
-        for img in images
+        for entry in page
     ]
+
+    etag = http_cache.etag_for(result)
+    return http_cache.not_modified(request, response, etag, {ASSET_TOTAL_HEADER: str(len(entries))}) or result
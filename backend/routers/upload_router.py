@@ -1,7 +1,7 @@
 import os
-import shutil
-import uuid
 from fastapi import APIRouter, UploadFile, File, HTTPException
+import uploads
+import thumbnails
 
 router = APIRouter(
     prefix="/api/upload",
@@ -19,34 +19,26 @@ async def upload_image(file: UploadFile = File(...), type: str = "item"):
     通用图片上传接口:param type: 'item' (单品) 或 'outfit' (搭配截图)
     """
     try:
-        filename = file.filename
-        ext = os.path.splitext(filename)[1].lower()
-        if ext not in [".jpg", ".jpeg", ".png", ".gif", ".webp"]:
-            ext = ".jpg"
-
         # 根据类型决定子目录
         if type == "outfit":
             subdir = "outfits"
         else:
             subdir = "items"
-            
+
         target_dir = os.path.join(BASE_UPLOAD_DIR, subdir)
-        
-        # 确保目录存在
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
 
-        # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4().hex}{ext}"
-        file_path = os.path.join(target_dir, unique_filename)
+        # 分块写入临时文件后原子改名，扩展名由文件头决定
+        unique_filename = await uploads.save_image(file, target_dir, uploads.MAX_IMAGE_BYTES)
+        url = f"/static/uploads/{subdir}/{unique_filename}"
 
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 缩略图 / 中图 / 大图在后台线程池生成，不等待
+        thumbnails.schedule(url)
 
         # 返回 URL (注意路径包含子目录)
-        return {"url": f"/static/uploads/{subdir}/{unique_filename}"}
+        return {"url": url}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"上传失败: {e}")
-        raise HTTPException(status_code=500, detail="文件上传失败")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="文件上传失败")
@@ -8,14 +8,14 @@
 #     return [{"message": "List of users"}]
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from database import get_db
 import models, schemas
 import security
 from fastapi import File, UploadFile
-import os
-import uuid
-import shutil
+import uploads
+import file_store
 # 创建路由
 router = APIRouter(
     prefix="/api/user",
@@ -23,17 +23,33 @@ router = APIRouter(
 )
 
 
+def find_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+
+def save_user(db: Session, user: models.User):
+    db.add(user)
+    db.flush()
+    # 新用户的仪表盘统计行（全为 0），之后由写接口增量维护
+    db.add(models.UserStats(user_id=user.user_id))
+    db.commit()
+    db.refresh(user)  # 刷新以获取自动生成的 user_id
+    return user
+
+
+# 注册 / 登录是 async 接口：bcrypt 在 security 的专用线程池中计算，
+# 数据库读写用 run_in_threadpool，等待哈希时不占用处理其它接口的线程
 # =======================
 # 注册接口
 # =======================
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # 检查用户名是否已存在
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+    db_user = await run_in_threadpool(find_user, db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="用户名已存在")
 
-    hashed_password = security.get_password_hash(user.password)
+    hashed_password = await security.hash_password_async(user.password)
 
     # 创建新用户
     new_user = models.User(
@@ -43,23 +59,22 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     )
 
     # 存入数据库
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)  # 刷新以获取自动生成的 user_id
-
-    return new_user
+    return await run_in_threadpool(save_user, db, new_user)
 
 
 # =======================
 # 登录接口
 # =======================
 @router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     # 1. 查用户
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+    db_user = await run_in_threadpool(find_user, db, user.username)
 
     # 2. 校验用户是否存在 & 密码是否正确
-    if not db_user or not security.verify_password(user.password, db_user.password):
+    valid, new_hash = (False, None)
+    if db_user:
+        valid, new_hash = await security.verify_password_async(user.password, db_user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -68,7 +83,7 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     access_token = security.create_access_token(data={"sub": str(db_user.user_id)})
 
     # 3. 登录成功 (这里简单返回用户信息，正规做法是返回 Token)
-    return {
+    result = {
         "msg": "登录成功",
         "code": 200,
         "data": {
@@ -79,33 +94,48 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
         }
     }
 
+    # bcrypt cost 调整过：用本次登录的明文按新 cost 重新哈希
+    if new_hash:
+        db_user.password = new_hash
+        await run_in_threadpool(db.commit)
+    return result
+
+
+def get_user(db: Session, user_id: int):
+    return db.query(models.User).filter(models.User.user_id == user_id).first()
 
+
+def save_user_update(db: Session, db_user: models.User, avatar):
+    if avatar is not None:
+        old_avatar = db_user.avatar
+        db_user.avatar = avatar
+        file_store.replace(db, old_avatar, db_user.avatar)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+# 与注册 / 登录一样是 async 接口：修改密码时 bcrypt 在专用线程池中计算（受排队上限约束）
 @router.put("/{user_id}", response_model=schemas.UserOut)
-def update_user(user_id: int, user_update: schemas.UserUpdate, db: Session = Depends(get_db)):
+async def update_user(user_id: int, user_update: schemas.UserUpdate, db: Session = Depends(get_db)):
     # 1. 查找用户
-    db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
+    db_user = await run_in_threadpool(get_user, db, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
     # 2. 如果修改了用户名，要检查是否和其他人重复
     if user_update.username and user_update.username != db_user.username:
-        existing_user = db.query(models.User).filter(models.User.username == user_update.username).first()
+        existing_user = await run_in_threadpool(find_user, db, user_update.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="该用户名已被占用")
         db_user.username = user_update.username
 
     # 3. 更新其他字段
     if user_update.password:
-        db_user.password = user_update.password  # 同样，实际项目中请记得加密
-
-    if user_update.avatar is not None:
-        db_user.avatar = user_update.avatar
+        db_user.password = await security.hash_password_async(user_update.password)
 
     # 4. 提交保存
-    db.commit()
-    db.refresh(db_user)
-
-    return db_user
+    return await run_in_threadpool(save_user_update, db, db_user, user_update.avatar)
 
 
 # =======================
@@ -118,30 +148,17 @@ async def upload_avatar(user_id: int, file: UploadFile = File(...), db: Session
     if not db_user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
-    # 2. 准备保存路径
-    # 确保 static/avatars 目录存在
+    # 2. 保存文件（分块写入临时文件后原子改名，扩展名由文件头决定）
     UPLOAD_DIR = "static/avatars"
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR)
-
-    # 3. 生成唯一文件名 (防止同名文件覆盖)
-    # file.filename 比如是 "photo.jpg" -> 取后缀 ".jpg"
-    file_extension = os.path.splitext(file.filename)[1]
-    # 生成比如 "uuid-uuid-uuid.jpg"
-    new_filename = f"{uuid.uuid4()}{file_extension}"
-
-    # 完整保存路径: static/avatars/xxxx.jpg
-    file_path = os.path.join(UPLOAD_DIR, new_filename)
-
-    # 4. 保存文件到硬盘
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    new_filename = await uploads.save_image(file, UPLOAD_DIR, uploads.MAX_AVATAR_BYTES)
 
-    # 5. 生成访问 URL
+    # 3. 生成访问 URL
     avatar_url = f"/static/avatars/{new_filename}"
 
-    # 6. 更新数据库
+    # 4. 更新数据库（旧头像没有其它引用时，提交后删除）
+    old_avatar = db_user.avatar
     db_user.avatar = avatar_url
+    file_store.replace(db, old_avatar, avatar_url)
     db.commit()
     db.refresh(db_user)
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 
 # 注册登录
@@ -92,6 +92,8 @@ class OutfitOut(BaseModel):
     season: Optional[str] = None
     style: Optional[str] = None
     image_url: Optional[str] = None
+    # 缩略图 / 中图 / 大图 URL，由接口按 image_url 填入（thumbnails.variant_urls）
+    image_variants: Optional[Dict[str, str]] = None
     create_time: datetime
     item_count: int
 
@@ -163,6 +165,8 @@ class ClothingItem(ClothingItemBase):
     created_at: datetime
     category: Optional[Category] = None
     tags: List[Tag] = []
+    # 缩略图 / 中图 / 大图 URL，由接口调用 thumbnails.attach_variants 填入
+    image_variants: Optional[Dict[str, str]] = None
 
     class Config:
         orm_mode = True
@@ -242,3 +246,17 @@ class SimilarClothingItem(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+MAX_BATCH_WISHLIST_IDS = 200
+
+
+class SimilarItemsBatchRequest(BaseModel):
+    wishlist_ids: Optional[List[int]] = Field(None, max_length=MAX_BATCH_WISHLIST_IDS)  # 为空时对整个心愿单计算
+    threshold: float = Field(0.01, ge=0, le=1)
+    limit: int = Field(10, ge=1, le=50)
+
+
+class WishlistSimilarItems(BaseModel):
+    wishlist_id: int
+    similar_items: List[SimilarClothingItem] = []
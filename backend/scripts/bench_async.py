@@ -0,0 +1,95 @@
+"""
+对比同步 / 异步两条数据库通道在并发下的吞吐
+
+在同一进程里分别组装只含同步路由、以及 async 路由优先的两个应用，
+用 httpx.AsyncClient + ASGITransport 直接调用（不经过网络），
+以 --concurrency 个并发请求轮流访问热点只读接口，输出 QPS 与延迟分位数。
+用法: python scripts/bench_async.py [--user-id 1] [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import httpx
+from fastapi import FastAPI
+
+import security
+from database_async import async_engine
+from routers import async_router, closet, outfit_router, wishlist
+
+ENDPOINTS = [
+    "/api/closet/categories",
+    "/api/closet/items/search?limit=20",
+    "/api/closet/items/search?query=衬衫&limit=20",
+    "/api/wishlist/items?limit=20",
+    "/api/outfits/items",
+    "/api/outfits/?limit=20",
+]
+
+
+def build_app(use_async):
+    app = FastAPI()
+    if use_async:
+        app.include_router(async_router.router)
+    for router in (closet.router, outfit_router.router, wishlist.router):
+        app.include_router(router)
+    return app
+
+
+async def run(app, token, total, concurrency):
+    """返回 (耗时秒数, 每个请求的延迟列表, 非 200 响应数)"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(ENDPOINTS[i % len(ENDPOINTS)], headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        # 预热：建立连接池、加载缓存
+        await asyncio.gather(*[one(i) for i in range(len(ENDPOINTS))])
+        latencies.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(total)])
+        elapsed = time.perf_counter() - start
+    # 连接绑定在本次事件循环上，结束前关闭
+    await async_engine.dispose()
+    return elapsed, latencies, errors
+
+
+def report(label, elapsed, latencies, errors):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<6} {len(latencies) / elapsed:8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   错误 {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步 / 异步数据库通道吞吐对比")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    token = security.create_access_token({"sub": str(args.user_id)})
+    print(f"{args.requests} 个请求，并发 {args.concurrency}，接口 {len(ENDPOINTS)} 个轮流访问")
+    for label, use_async in (("sync", False), ("async", True)):
+        elapsed, latencies, errors = asyncio.run(run(build_app(use_async), token, args.requests, args.concurrency))
+        report(label, elapsed, latencies, errors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+对比鉴权依赖改造前后每个请求的开销
+
+1. 函数级：每次 jwt.decode 验签 vs security.verify_token（命中缓存）
+2. 请求级：在同一进程里组装一个只有空接口的应用，分别挂上
+     - none：不鉴权（基线）
+     - legacy：改造前的依赖（同步函数 + Depends(get_db) + 每次验签）
+     - cached：现在的 security.get_current_user_id
+   用 httpx.AsyncClient + ASGITransport 直接调用，输出 QPS、延迟分位数以及相对基线多出的耗时。
+   空接口不访问数据库，不需要可用的数据库连接。
+用法: python scripts/bench_auth.py [--calls 20000] [--requests 5000] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+import security
+from database import get_db
+
+
+def legacy_get_current_user_id(token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)) -> int:
+    """改造前的 get_current_user_id（仅用于对比）"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无法验证凭据",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+    return int(user_id)
+
+
+def build_app():
+    app = FastAPI()
+
+    @app.get("/none")
+    def no_auth():
+        return {"user_id": None}
+
+    @app.get("/legacy")
+    def legacy(user_id: int = Depends(legacy_get_current_user_id)):
+        return {"user_id": user_id}
+
+    @app.get("/cached")
+    def cached(user_id: int = Depends(security.get_current_user_id)):
+        return {"user_id": user_id}
+
+    return app
+
+
+def bench_functions(token, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    decode_us = (time.perf_counter() - start) / calls * 1e6
+
+    security.clear_token_cache()
+    security.verify_token(token)
+    start = time.perf_counter()
+    for _ in range(calls):
+        security.verify_token(token)
+    cached_us = (time.perf_counter() - start) / calls * 1e6
+
+    print(f"jwt.decode            {decode_us:8.2f} µs/次")
+    print(f"verify_token（命中）  {cached_us:8.2f} µs/次")
+
+
+async def run(app, path, token, total, concurrency):
+    """返回 (耗时秒数, 每个请求的延迟列表, 非 200 响应数)"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        # 预热
+        await asyncio.gather(*[one() for _ in range(concurrency)])
+        latencies.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="鉴权依赖开销对比")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--calls", type=int, default=20000, help="函数级对比的调用次数")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    token = security.create_access_token({"sub": str(args.user_id)})
+    bench_functions(token, args.calls)
+
+    print(f"\n{args.requests} 个请求，并发 {args.concurrency}")
+    app = build_app()
+    baseline = None
+    for label in ("none", "legacy", "cached"):
+        elapsed, latencies, errors = asyncio.run(run(app, f"/{label}", token, args.requests, args.concurrency))
+        per_request = elapsed / len(latencies) * 1e6
+        if baseline is None:
+            baseline = per_request
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(
+            f"{label:<7} {len(latencies) / elapsed:8.1f} req/s   p50 {p50:6.2f} ms   p99 {p99:6.2f} ms   "
+            f"鉴权开销 {per_request - baseline:7.1f} µs/请求   错误 {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+检查各接口的 SQL 条数是否为常数（不随返回行数增长）
+
+直接调用路由函数，并按接口的 response_model 序列化结果（懒加载就发生在这一步），
+统计期间执行的 SQL 条数，超过上限时以非 0 状态退出。
+用法: python scripts/check_query_counts.py [user_id]
+"""
+import sys
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+import models
+import similarity_index
+import response_cache
+import reference_data
+from routers import closet, outfit_router, wishlist
+
+
+class QueryCounter:
+    """统计 with 块内 engine 执行的 SQL 条数"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+def find_route(router, endpoint):
+    for route in router.routes:
+        if route.endpoint is endpoint:
+            return route
+    raise LookupError(endpoint.__name__)
+
+
+def fake_request(route):
+    """需要 Request 的接口（ETag / 响应缓存）使用的最小 GET 请求"""
+    return Request({"type": "http", "method": "GET", "path": route.path, "query_string": b"", "headers": []})
+
+
+def run_check(router, endpoint, max_queries, **kwargs):
+    """调用接口并序列化，返回是否在上限内（响应缓存先清空，统计的是未命中时的查询）"""
+    db = SessionLocal()
+    try:
+        route = find_route(router, endpoint)
+        if "request" in kwargs:
+            kwargs["request"] = fake_request(route)
+        response_cache.clear()
+        with QueryCounter() as counter:
+            result = endpoint(db=db, **kwargs)
+            # 经过响应缓存的接口已在内部序列化
+            if route.response_model is not None and not isinstance(result, Response):
+                TypeAdapter(route.response_model).validate_python(result, from_attributes=True)
+        ok = counter.count <= max_queries
+        print(f"{'✅' if ok else '❌'} {endpoint.__name__}: {counter.count} 条 SQL (上限 {max_queries})")
+        return ok
+    finally:
+        db.close()
+
+
+def main():
+    db = SessionLocal()
+    try:
+        if len(sys.argv) > 1:
+            user_id = int(sys.argv[1])
+        else:
+            first = db.query(models.ClothingItem.user_id).first()
+            if first is None:
+                print("❌ 数据库中没有衣物数据，请先运行 scripts/inject_local.py")
+                return 1
+            user_id = first[0]
+
+        outfit = db.query(models.Outfit.outfit_id).filter(models.Outfit.user_id == user_id).first()
+        wish = db.query(models.WishlistItem.wishlist_id).filter(models.WishlistItem.user_id == user_id).first()
+        category = db.query(models.ClothingItem.category_id).filter(models.ClothingItem.user_id == user_id).first()
+        # 与 main.py 启动时一样预加载分类 / 标签，不计入各接口的查询条数
+        reference_data.load(db)
+    finally:
+        db.close()
+
+    print(f"检查用户 {user_id} 的接口查询条数")
+    results = [
+        run_check(closet.router, closet.get_categories, 2, request=None, response=Response(), user_id=user_id),
+        run_check(closet.router, closet.search_items, 2, response=Response(), query=None, category_id=None,
+                  color=None, season=None, skip=0, limit=100, cursor=None, user_id=user_id),
+        run_check(closet.router, closet.get_category_with_clothes, 3, category_id=category[0],
+                  response=Response(), skip=0, limit=100, cursor=None, user_id=user_id),
+        run_check(outfit_router.router, outfit_router.get_user_items, 1, request=None, response=Response(),
+                  user_id=user_id),
+    ]
+    if outfit is not None:
+        results.append(run_check(outfit_router.router, outfit_router.get_outfit_detail, 2,
+                                 outfit_id=outfit[0], user_id=user_id))
+    if wish is not None:
+        results.append(run_check(wishlist.router, wishlist.get_wishlist_items, 2, request=None, response=Response(),
+                                 skip=0, limit=100, cursor=None, added_to_closet=None, user_id=user_id))
+        # 冷启动：相似度索引需要加载一次衣橱
+        similarity_index.invalidate(user_id)
+        results.append(run_check(wishlist.router, wishlist.find_similar_items, 2, wishlist_id=wish[0],
+                                 threshold=0.01, limit=50, user_id=user_id))
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+文本相似度后端与原 SequenceMatcher 打分的对比
+
+在示例数据（inject_local.py 使用的 static/uploads/items/items.json）上，
+对 name / style / color 三个字段的所有两两组合：
+  1. 用原来的 calculate_text_similarity（完全一致 1.0 / 子串 0.8 / SequenceMatcher.ratio）算出参考分数；
+  2. 用 similarity.TextColumn 的 ngram / minhash 后端批量打分，
+     输出平均 / 最大绝对误差、Pearson 相关系数、是否非零的一致率、每件单品 top-k 的重合率和耗时；
+  3. 统计 LSH 桶的候选比例，以及参考分数达到阈值的文本对落在同一个桶里的比例（召回率）；
+  4. 以每件单品为查询、全部单品为衣橱，比较 similarity_index 的 exact / lsh 两种召回方式
+     在阈值下的候选数与 top-k 结果重合率。
+用法: python scripts/compare_text_similarity.py [数据文件] [--top-k 5] [--threshold 0.3]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from difflib import SequenceMatcher
+from types import SimpleNamespace
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import numpy as np
+
+import bulk_import
+import similarity
+import similarity_index
+
+DATA_FILE = os.path.join(BASE_DIR, "static", "uploads", "items", "items.json")
+FIELDS = ("name", "style", "color")
+LSH_RECALL_LEVELS = (0.3, 0.5, 0.7)
+
+
+def sequence_matcher_similarity(text1, text2):
+    """改造前 routers/wishlist.py 中的 calculate_text_similarity（参考实现）"""
+    if not text1 or not text2:
+        return 0.0
+    text1 = text1.lower().strip()
+    text2 = text2.lower().strip()
+    if text1 == text2:
+        return 1.0
+    if text1 in text2 or text2 in text1:
+        return 0.8
+    ratio = SequenceMatcher(None, text1, text2).ratio()
+    return ratio if ratio > 0.1 else 0.0
+
+
+def load_items(path):
+    with open(path, "rb") as f:
+        content = f.read()
+    records, _ = bulk_import.parse_records(content, bulk_import.detect_format(None, filename=path))
+    category_ids = {}
+    items = []
+    for row_no, record in records:
+        category = record.get("category")
+        items.append(SimpleNamespace(
+            item_id=row_no, user_id=0,
+            category_id=category_ids.setdefault(category, len(category_ids) + 1) if category else None,
+            category=None,
+            name=record.get("name"), brand=record.get("brand"), color=record.get("color"),
+            season=record.get("season"), occasion=record.get("occasion"), style=record.get("style"),
+            image_url=None, price=record.get("price"),
+        ))
+    return items
+
+
+def reference_matrix(texts):
+    n = len(texts)
+    scores = np.zeros((n, n), dtype=np.float64)
+    start = time.perf_counter()
+    for i in range(n):
+        for j in range(n):
+            scores[i, j] = sequence_matcher_similarity(texts[i], texts[j])
+    return scores, time.perf_counter() - start
+
+
+def top_k_overlap(reference, scores, k):
+    """每行（去掉自身）按参考分数与后端分数各取 top-k，返回平均重合比例"""
+    n = reference.shape[0]
+    overlaps = []
+    for i in range(n):
+        mask = np.arange(n) != i
+        ref_row, row = reference[i, mask], scores[i, mask]
+        if not ref_row.any():
+            continue
+        kk = min(k, int((ref_row > 0).sum()))
+        expected = set(np.argsort(-ref_row, kind="stable")[:kk])
+        actual = set(np.argsort(-row, kind="stable")[:kk])
+        overlaps.append(len(expected & actual) / kk)
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+
+def compare_field(items, field, k):
+    texts = [similarity.normalize_text(getattr(item, field)) for item in items]
+    reference, ref_seconds = reference_matrix(texts)
+    pairs = np.triu_indices(len(texts), 1)
+    ref_pairs = reference[pairs]
+    print(f"\n[{field}] {len(texts)} 条，{len(ref_pairs)} 对；SequenceMatcher 耗时 {ref_seconds * 1000:.1f} ms")
+    print(f"  {'后端':<8} {'平均误差':>8} {'最大误差':>8} {'Pearson':>8} {'非零一致':>8} {'top-' + str(k):>8} {'耗时 ms':>8}")
+
+    for backend in similarity.TEXT_BACKENDS:
+        similarity.minhash_signature.cache_clear()
+        start = time.perf_counter()
+        scores = similarity.TextColumn(texts, backend).similarity(texts)
+        seconds = time.perf_counter() - start
+        got = scores[pairs]
+        error = np.abs(got - ref_pairs)
+        pearson = float(np.corrcoef(got, ref_pairs)[0, 1]) if got.std() > 0 and ref_pairs.std() > 0 else 1.0
+        agree = float(((got > 0) == (ref_pairs > 0)).mean())
+        print(
+            f"  {backend:<8} {error.mean():8.3f} {error.max():8.3f} {pearson:8.3f} {agree:8.1%} "
+            f"{top_k_overlap(reference, scores, k):8.1%} {seconds * 1000:8.1f}"
+        )
+
+    # LSH：同一个桶内的文本对视为候选
+    buckets = {}
+    for row, text in enumerate(texts):
+        for band_key in similarity.lsh_bands(text):
+            buckets.setdefault(band_key, set()).add(row)
+    candidate = np.zeros_like(reference, dtype=bool)
+    for rows in buckets.values():
+        rows = list(rows)
+        candidate[np.ix_(rows, rows)] = True
+    candidate_pairs = candidate[pairs]
+    recalls = []
+    for level in LSH_RECALL_LEVELS:
+        wanted = ref_pairs >= level
+        recalls.append(f"≥{level}: {candidate_pairs[wanted].mean():.1%} ({wanted.sum()} 对)" if wanted.any() else f"≥{level}: -")
+    print(f"  LSH 候选比例 {candidate_pairs.mean():.1%}；召回率 " + "，".join(recalls))
+
+
+def compare_candidates(items, k, threshold):
+    """similarity_index 两种召回方式：候选数与 top-k 相对全量打分的重合率"""
+    indexes = {mode: similarity_index.UserSimilarityIndex(items, mode) for mode in similarity_index.CANDIDATE_MODES}
+    features = similarity.ClosetFeatures(items)
+    sizes = {mode: [] for mode in indexes}
+    overlaps = {mode: [] for mode in indexes}
+    for item in items:
+        # 同分的单品先后顺序不固定，按分数（多重集合）比较
+        expected = Counter(round(score, 9) for _, score, _ in features.top_k(item, k, threshold))
+        for mode, index in indexes.items():
+            sizes[mode].append(len(index.candidates(item, threshold)))
+            if expected:
+                actual = Counter(round(score, 9) for _, score, _ in index.top_k(item, k, threshold))
+                overlaps[mode].append(sum((expected & actual).values()) / sum(expected.values()))
+    print(f"\n[召回] 阈值 {threshold}，{len(items)} 件单品互为查询（top-{k} 分数与全量打分比较）")
+    for mode, values in sizes.items():
+        recall = np.mean(overlaps[mode]) if overlaps[mode] else 1.0
+        print(f"  {mode:<6} 平均候选 {np.mean(values):6.1f} / {len(items)}   top-{k} 重合率 {recall:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本相似度后端与 SequenceMatcher 的对比")
+    parser.add_argument("path", nargs="?", default=DATA_FILE)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.3, help="召回对比使用的总分阈值")
+    args = parser.parse_args()
+
+    items = load_items(args.path)
+    if not items:
+        print(f"❌ {args.path} 中没有数据")
+        return
+    for field in FIELDS:
+        compare_field(items, field, args.top_k)
+    compare_candidates(items, args.top_k, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+衣物全文搜索倒排索引（中英文通用）
+
+LIKE '%kw%' 无法走 B-tree 索引，每次搜索都要扫描用户全部衣物。
+这里把 name/brand/color/season/style/occasion 拆成字符 1-gram 与 2-gram
+写入 clothing_search_tokens 表，搜索时：
+  - 关键词长度 >= 2 时取其 2-gram，否则取 1-gram；
+  - 某个字段包含全部查询 gram 即视为该字段命中（由 (user_id, token) 索引提供）；
+  - 各命中字段的权重相加作为相关度，用于排序。
+只依赖普通表和 GROUP BY，openGauss / PostgreSQL / SQLite 都可以使用。
+"""
+import re
+
+from sqlalchemy import func, select
+
+import models
+
+# 字段权重：名称最重要
+FIELD_WEIGHTS = {
+    'name': 4,
+    'brand': 3,
+    'style': 2,
+    'occasion': 2,
+    'color': 1,
+    'season': 1,
+}
+
+
+def normalize_keyword(value):
+    """与 build_chinese_search_filter 一致：去掉所有空白；另外统一小写"""
+    return re.sub(r'\s+', '', value or '').lower()
+
+
+def item_tokens(text):
+    """文本的全部 1-gram 与 2-gram，用于建索引"""
+    tokens = set(text)
+    tokens.update(text[i:i + 2] for i in range(len(text) - 1))
+    return tokens
+
+
+def query_tokens(keyword):
+    """关键词的查询 gram：长度 >= 2 用 2-gram，否则用 1-gram"""
+    if len(keyword) < 2:
+        return set(keyword)
+    return {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+
+
+def build_rows(item):
+    """生成某件衣物的倒排行"""
+    rows = []
+    for field, weight in FIELD_WEIGHTS.items():
+        text = normalize_keyword(getattr(item, field))
+        for token in item_tokens(text):
+            rows.append({
+                'item_id': item.item_id,
+                'field': field,
+                'token': token,
+                'user_id': item.user_id,
+                'weight': weight,
+            })
+    return rows
+
+
+def remove_item(db, item_id):
+    """删除某件衣物的倒排行"""
+    db.query(models.ClothingSearchToken) \
+        .filter(models.ClothingSearchToken.item_id == item_id) \
+        .delete(synchronize_session=False)
+
+
+def index_item(db, item):
+    """（重新）索引一件衣物，需在 item_id 已生成（flush）之后、commit 之前调用"""
+    remove_item(db, item.item_id)
+    rows = build_rows(item)
+    if rows:
+        db.execute(models.ClothingSearchToken.__table__.insert(), rows)
+
+
+def index_items(db, items):
+    """批量索引多件新衣物（不删除旧行）"""
+    rows = [row for item in items for row in build_rows(item)]
+    if rows:
+        db.execute(models.ClothingSearchToken.__table__.insert(), rows)
+
+
+def ranking_subquery(user_id, keyword):
+    """
+    返回 (item_id, score) 子查询；关键词为空时返回 None
+    只有包含全部查询 gram 的字段才计分
+    """
+    keyword = normalize_keyword(keyword)
+    if not keyword:
+        return None
+
+    tokens = query_tokens(keyword)
+    token_table = models.ClothingSearchToken
+
+    field_hits = select(
+        token_table.item_id.label('item_id'),
+        func.max(token_table.weight).label('weight')
+    ).where(
+        token_table.user_id == user_id,
+        token_table.token.in_(tokens)
+    ).group_by(
+        token_table.item_id, token_table.field
+    ).having(
+        func.count(func.distinct(token_table.token)) == len(tokens)
+    ).subquery()
+
+    return select(
+        field_hits.c.item_id.label('item_id'),
+        func.sum(field_hits.c.weight).label('score')
+    ).group_by(field_hits.c.item_id).subquery()
+
+
+def rebuild(db, user_id=None):
+    """重建索引（全部用户或单个用户），用于初次上线或数据修复"""
+    query = db.query(models.ClothingItem)
+    tokens = db.query(models.ClothingSearchToken)
+    if user_id is not None:
+        query = query.filter(models.ClothingItem.user_id == user_id)
+        tokens = tokens.filter(models.ClothingSearchToken.user_id == user_id)
+
+    tokens.delete(synchronize_session=False)
+    count = 0
+    batch = []
+    for item in query.yield_per(500):
+        batch.append(item)
+        if len(batch) >= 500:
+            index_items(db, batch)
+            count += len(batch)
+            batch = []
+    index_items(db, batch)
+    count += len(batch)
+    db.commit()
+    return count
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"✅ 已重建搜索索引，共 {rebuild(session)} 件衣物")
+    finally:
+        session.close()
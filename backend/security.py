@@ -1,20 +1,35 @@
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+import asyncio
+import threading
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from database import get_db
+from database import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
 import models
 
 # 1. 配置参数 (生产环境请修改密钥)
 SECRET_KEY = "final_project_secret_key_2025"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # Token有效期24小时
+# 已验证 Token 的缓存：同一个 Token 在 TTL 内不再重复验签（缓存时间不超过 Token 自身的过期时间）
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_TTL_SECONDS = 300
 
 # 2. 密码加密工具
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min / max 与默认 cost 相同：已有哈希的 cost 与配置不一致时 needs_update 为真，登录成功后重新哈希
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+# bcrypt 故意很慢，放在专用线程池里执行（bcrypt 计算时释放 GIL），登录高峰不会占满处理其它接口的线程池
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+_hash_lock = threading.Lock()
 
 # 3. 定义Token获取地址 (用于Swagger文档调试)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/user/login")
@@ -26,6 +41,42 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update(plain_password, hashed_password):
+    """
+    校验密码，返回 (是否正确, 新哈希)；cost 与配置一致时新哈希为 None
+    无法识别的哈希（如明文）视为不匹配
+    """
+    if not hashed_password:
+        return False, None
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except ValueError:
+        return False, None
+
+async def _run_hash_job(func, *args):
+    """在 bcrypt 专用线程池中执行；排队任务超过 PASSWORD_HASH_MAX_PENDING 时返回 503"""
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="请求过多，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+        _hash_pending += 1
+    try:
+        return await asyncio.wrap_future(_hash_executor.submit(func, *args))
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+async def hash_password_async(password):
+    return await _run_hash_job(get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    """异步版 verify_and_update，供 async 接口调用"""
+    return await _run_hash_job(verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -33,18 +84,63 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# --- 核心依赖：解析Token获取当前用户ID ---
-def get_current_user_id(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> int:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="无法验证凭据",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# --- Token 验证缓存 ---
+_token_cache = OrderedDict()  # token -> (缓存失效时间 monotonic, user_id)
+_token_lock = threading.Lock()
+
+
+def decode_token(token: str):
+    """验签并解析 Token，返回 (用户 ID, exp)；无效或过期时返回 None（不经过缓存）"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    return int(user_id)
\ No newline at end of file
+            return None
+        return int(user_id), payload.get("exp")
+    except (JWTError, ValueError):
+        return None
+
+
+def verify_token(token: str) -> Optional[int]:
+    """返回 Token 对应的用户 ID，无效时返回 None；验证通过的结果缓存 TOKEN_CACHE_TTL_SECONDS 秒"""
+    now = time.monotonic()
+    with _token_lock:
+        cached = _token_cache.get(token)
+        if cached is not None:
+            if cached[0] > now:
+                _token_cache.move_to_end(token)
+                return cached[1]
+            del _token_cache[token]
+
+    decoded = decode_token(token)
+    if decoded is None:
+        # 无效 Token 不缓存，避免随机 Token 把有效条目挤出去
+        return None
+    user_id, exp = decoded
+    ttl = TOKEN_CACHE_TTL_SECONDS
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        with _token_lock:
+            _token_cache[token] = (now + ttl, user_id)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return user_id
+
+
+def clear_token_cache():
+    with _token_lock:
+        _token_cache.clear()
+
+
+# --- 核心依赖：解析Token获取当前用户ID ---
+# 不依赖 get_db：验证 Token 不需要数据库会话；async def 直接在事件循环中执行，不占用线程池
+async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    user_id = verify_token(token)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无法验证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
\ No newline at end of file
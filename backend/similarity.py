@@ -0,0 +1,341 @@
+"""
+心愿单 / 衣橱相似度批量打分引擎
+
+把用户衣橱预先转换为列式特征数组（颜色组、季节、分类 id 以及
+name/brand/style/occasion 的字符 n-gram 倒排），对一件心愿单单品
+一次 NumPy 计算出所有衣物的分数，再用 argpartition 取 top-k。
+权重见 DEFAULT_WEIGHTS。
+颜色、季节的归一化（中文名 / 色值 / 别名 -> 颜色组、Lab 坐标、季节 id）由 attribute_vocab 提供。
+
+文本相似度以查询与每行共有的 n-gram 数为基础（完全一致 / 包含 / Dice 系数都由它得出），
+共有数的计算方式可切换（TEXT_BACKEND）：
+  - ngram：倒排表精确计数（默认）；
+  - minhash：按文本缓存的 MinHash 签名估计 Jaccard 再换算，每对只比较固定个数的整数。
+MinHash 签名分带（LSH）后还可作为 similarity_index 的候选召回 token。
+与原 SequenceMatcher 打分的误差对比见 scripts/compare_text_similarity.py。
+"""
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+import attribute_vocab
+
+DEFAULT_WEIGHTS = {
+    'name': 0.2,
+    'brand': 0.05,
+    'color': 0.3,
+    'category': 0.25,
+    'season': 0.1,
+    'occasion': 0.05,
+    'style': 0.05
+}
+
+TEXT_FIELDS = ('name', 'brand', 'occasion', 'style')
+
+# top_k_many 每批打分的心愿单件数：中间矩阵为 QUERY_CHUNK_SIZE × M，内存不随心愿单长度增长
+QUERY_CHUNK_SIZE = 64
+
+def normalize_text(value):
+    """文本归一化：小写 + 去首尾空白"""
+    return (value or '').lower().strip()
+
+
+def char_ngrams(text):
+    """字符 1-gram + 2-gram 集合，兼容中文短文本"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+# ===================== MinHash / LSH =====================
+TEXT_BACKENDS = ('ngram', 'minhash')
+TEXT_BACKEND = 'ngram'
+
+MINHASH_PERMUTATIONS = 64
+# 每个 LSH 带包含的签名值个数：共 64 / 2 = 32 个带，Jaccard 约 0.18 以上的文本大概率落入同一个桶
+LSH_ROWS = 2
+
+# 各置换为 multiply-shift 哈希 (a × h + b) mod 2^64 的高 32 位，a 为奇数
+_minhash_rng = np.random.RandomState(20240611)
+_MINHASH_A = _minhash_rng.randint(0, 1 << 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_MINHASH_B = _minhash_rng.randint(0, 1 << 63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+# 空文本的签名：取最大值，与任何非空文本都不相等
+_EMPTY_SIGNATURE = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+_EMPTY_SIGNATURE.setflags(write=False)
+
+
+@lru_cache(maxsize=65536)
+def minhash_signature(text):
+    """文本 n-gram 集合的 MinHash 签名（按文本缓存，衣物重建特征时不再重复计算）"""
+    grams = char_ngrams(text)
+    if not grams:
+        return _EMPTY_SIGNATURE
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'little') for gram in grams],
+        dtype=np.uint64
+    )
+    signature = ((hashes[:, None] * _MINHASH_A[None, :] + _MINHASH_B[None, :]) >> np.uint64(32)).min(axis=0)
+    signature.setflags(write=False)
+    return signature
+
+
+def lsh_bands(text):
+    """文本的 LSH 桶：[(带序号, 该带的签名字节)]，空文本没有桶"""
+    if not text:
+        return []
+    signature = minhash_signature(text)
+    return [
+        (band, signature[start:start + LSH_ROWS].tobytes())
+        for band, start in enumerate(range(0, MINHASH_PERMUTATIONS, LSH_ROWS))
+    ]
+
+
+def season_similarity(season1, season2):
+    """单对季节相似度（similarity_index 按季节 token 召回时使用），与 ClosetFeatures.season_similarity 语义一致"""
+    if not season1 or not season2:
+        return 0.0
+    if season1 == season2:
+        return 1.0
+    id1, id2 = attribute_vocab.season_id(season1), attribute_vocab.season_id(season2)
+    if id1 >= 0 and id1 == id2:
+        return 1.0
+    if id1 == attribute_vocab.ALL_SEASONS_ID or id2 == attribute_vocab.ALL_SEASONS_ID:
+        return 0.7
+    if id1 >= 0 and id2 >= 0:
+        return float(attribute_vocab.SEASON_MATRIX[id1, id2])
+    return 0.0
+
+
+class TextColumn:
+    """一列文本特征：取值 id（精确匹配）+ n-gram 倒排或 MinHash 签名（近似 ratio / 包含关系）"""
+
+    def __init__(self, values, backend=None):
+        self.backend = backend or TEXT_BACKEND
+        if self.backend not in TEXT_BACKENDS:
+            raise ValueError(f"未知的文本相似度后端: {self.backend}")
+        self.size = len(values)
+        self.value_ids = np.full(self.size, -1, dtype=np.int64)
+        self.gram_counts = np.zeros(self.size, dtype=np.float64)
+        self._vocab = {}
+        postings = {}
+
+        for row, value in enumerate(values):
+            if not value:
+                continue
+            self.value_ids[row] = self._vocab.setdefault(value, len(self._vocab))
+            grams = char_ngrams(value)
+            self.gram_counts[row] = len(grams)
+            if self.backend == 'ngram':
+                for gram in grams:
+                    postings.setdefault(gram, []).append(row)
+
+        self.postings = {gram: np.array(rows, dtype=np.int64) for gram, rows in postings.items()}
+        self.signatures = None
+        if self.backend == 'minhash':
+            self.signatures = np.array(
+                [minhash_signature(value) for value in values], dtype=np.uint64
+            ).reshape(self.size, MINHASH_PERMUTATIONS)
+
+    def overlap(self, queries):
+        """
+        多个查询的 n-gram 与每一行共有的 n-gram 数量，返回 N×M 矩阵
+        所有 (查询, 行) 对展平后只做一次 bincount
+        """
+        flat = []
+        for q, grams in enumerate(queries):
+            rows = [self.postings[g] for g in grams if g in self.postings]
+            if rows:
+                flat.append(np.concatenate(rows) + q * self.size)
+        if not flat:
+            return np.zeros((len(queries), self.size), dtype=np.float64)
+        counts = np.bincount(np.concatenate(flat), minlength=len(queries) * self.size)
+        return counts.reshape(len(queries), self.size).astype(np.float64)
+
+    def estimated_overlap(self, texts, query_counts):
+        """
+        由 MinHash 签名估计共有 n-gram 数：|A∩B| = J / (1 + J) × (|A| + |B|)
+        取整并截断到较短集合的大小，使 contained / dice 的含义与精确计数一致
+        """
+        jaccard = np.zeros((len(texts), self.size), dtype=np.float64)
+        for q, text in enumerate(texts):
+            if text:
+                jaccard[q] = (self.signatures == minhash_signature(text)[None, :]).mean(axis=1)
+        overlap = np.rint(jaccard / (1.0 + jaccard) * (self.gram_counts[None, :] + query_counts))
+        return np.minimum(overlap, np.minimum(self.gram_counts[None, :], query_counts))
+
+    def match(self, texts):
+        """
+        返回 (exact, contained, dice) 三个 N×M 矩阵
+        contained 以 n-gram 集合包含近似子串关系，dice 近似 SequenceMatcher.ratio
+        """
+        grams = [char_ngrams(text) if text else set() for text in texts]
+        query_counts = np.array([len(g) for g in grams], dtype=np.float64)[:, None]
+        if self.backend == 'minhash':
+            overlap = self.estimated_overlap(texts, query_counts)
+        else:
+            overlap = self.overlap(grams)
+        present = (self.value_ids >= 0)[None, :] & (query_counts > 0)
+
+        query_ids = np.array([self._vocab.get(text, -2) for text in texts], dtype=np.int64)[:, None]
+        exact = present & (self.value_ids[None, :] == query_ids)
+        contained = present & (overlap == np.minimum(self.gram_counts[None, :], query_counts))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dice = np.where(present, 2.0 * overlap / (self.gram_counts[None, :] + query_counts), 0.0)
+        return exact, contained, dice
+
+    def similarity(self, texts):
+        """文本相似度：完全一致 1.0 / 包含 0.8 / n-gram Dice 系数（超过 0.1 才计分），返回 N×M 矩阵"""
+        exact, contained, dice = self.match(texts)
+        scores = np.where(dice > 0.1, dice, 0.0)
+        scores = np.where(contained, 0.8, scores)
+        return np.where(exact, 1.0, scores)
+
+
+class ClosetFeatures:
+    """某个用户衣橱的列式特征，构建一次即可对任意心愿单单品批量打分"""
+
+    def __init__(self, items, text_backend=None):
+        self.items = list(items)
+        self.size = len(self.items)
+
+        self.item_ids = np.array([item.item_id for item in self.items], dtype=np.int64)
+        self.category_ids = np.array(
+            [item.category_id or -1 for item in self.items], dtype=np.int64
+        )
+
+        # 季节：已知写法（含 All / 四季 等别名）映射到矩阵下标，原始字符串单独编号用于精确匹配
+        season_vocab = {}
+        self.season_ids = np.full(self.size, -1, dtype=np.int64)
+        self.season_value_ids = np.full(self.size, -1, dtype=np.int64)
+        for row, item in enumerate(self.items):
+            if item.season:
+                self.season_ids[row] = attribute_vocab.season_id(item.season)
+                self.season_value_ids[row] = season_vocab.setdefault(item.season, len(season_vocab))
+        self._season_vocab = season_vocab
+
+        # 颜色名很短且包含关系有单独的分值，始终精确计数
+        colors = [normalize_text(item.color) for item in self.items]
+        self.color = TextColumn(colors, 'ngram')
+        self.color_masks = np.array([attribute_vocab.color_group_mask(color) for color in colors], dtype=np.int64)
+        self.color_labs, self.color_known = attribute_vocab.color_labs(colors)
+
+        self.text = {
+            field: TextColumn([normalize_text(getattr(item, field)) for item in self.items], text_backend)
+            for field in TEXT_FIELDS
+        }
+
+    def color_similarity(self, colors):
+        """颜色相似度：同一种颜色 1.0 / 同一颜色组 0.7 / 名称包含 0.5，返回 N×M 矩阵"""
+        colors = [normalize_text(color) for color in colors]
+        exact, contained, _ = self.color.match(colors)
+        query_masks = np.array([attribute_vocab.color_group_mask(color) for color in colors], dtype=np.int64)
+        same_group = (self.color_masks[None, :] & query_masks[:, None]) != 0
+        # 同组且色差很小（"red" / "红色" / "#ff0000"）视为同一种颜色
+        query_labs, query_known = attribute_vocab.color_labs(colors)
+        same_color = same_group & (query_known[:, None] & self.color_known[None, :]) & \
+            (attribute_vocab.delta_e(query_labs, self.color_labs) <= attribute_vocab.SAME_COLOR_DELTA_E)
+
+        scores = np.where(contained, 0.5, 0.0)
+        scores = np.where(same_group, 0.7, scores)
+        return np.where(exact | same_color, 1.0, scores)
+
+    def season_similarity(self, seasons):
+        """季节相似度：相同 1.0 / All Seasons 与其它季节 0.7 / 其余查季节矩阵，返回 N×M 矩阵"""
+        query_ids = np.array([attribute_vocab.season_id(season) for season in seasons], dtype=np.int64)[:, None]
+        query_present = np.array([bool(season) for season in seasons])[:, None]
+        present = (self.season_value_ids >= 0)[None, :] & query_present
+
+        known = (query_ids >= 0) & (self.season_ids >= 0)[None, :]
+        matrix = attribute_vocab.SEASON_MATRIX
+        scores = np.where(known, matrix[np.maximum(query_ids, 0), np.maximum(self.season_ids, 0)[None, :]], 0.0)
+        either_all = (query_ids == attribute_vocab.ALL_SEASONS_ID) | \
+            (self.season_ids == attribute_vocab.ALL_SEASONS_ID)[None, :]
+        scores = np.where(either_all, 0.7, scores)
+
+        query_value_ids = np.array(
+            [self._season_vocab.get(season, -2) for season in seasons], dtype=np.int64
+        )[:, None]
+        exact = (self.season_value_ids[None, :] == query_value_ids) | \
+            ((query_ids >= 0) & (self.season_ids[None, :] == query_ids))
+        return np.where(present, np.where(exact, 1.0, scores), 0.0)
+
+    def score_matrix(self, wishlist_items, weights=None):
+        """
+        一次计算 N 件心愿单单品 × M 件衣物的相似度
+        :return: (N×M 总分矩阵, {字段: N×M 分数矩阵})
+        """
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+
+        wishlist_items = list(wishlist_items)
+        category_ids = np.array(
+            [item.category_id or -2 for item in wishlist_items], dtype=np.int64
+        )[:, None]
+
+        similarities = {
+            field: self.text[field].similarity(
+                [normalize_text(getattr(item, field)) for item in wishlist_items]
+            )
+            for field in TEXT_FIELDS
+        }
+        similarities['color'] = self.color_similarity([item.color for item in wishlist_items])
+        similarities['category'] = (self.category_ids[None, :] == category_ids).astype(np.float64)
+        similarities['season'] = self.season_similarity([item.season for item in wishlist_items])
+
+        total = np.zeros((len(wishlist_items), self.size), dtype=np.float64)
+        for field, weight in weights.items():
+            total += similarities[field] * weight
+
+        return total, similarities
+
+    def score(self, wishlist_item, weights=None):
+        """对全部衣物打分，返回 (总分数组, {字段: 分数数组})"""
+        total, similarities = self.score_matrix([wishlist_item], weights)
+        return total[0], {field: values[0] for field, values in similarities.items()}
+
+    def _select(self, total, similarities, k, threshold, mask=None):
+        """在一行分数中用 argpartition 选出 >= threshold 的前 k 个（mask 为 False 的行不参与）"""
+        selected = total >= threshold
+        if mask is not None:
+            selected &= mask
+        rows = np.flatnonzero(selected)
+        if rows.size > k:
+            rows = rows[np.argpartition(-total[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-total[rows], kind='stable')]
+
+        return [
+            (
+                self.items[row],
+                float(total[row]),
+                {field: float(values[row]) for field, values in similarities.items()}
+            )
+            for row in rows
+        ]
+
+    def top_k(self, wishlist_item, k, threshold=0.0, weights=None, mask=None):
+        """
+        返回分数 >= threshold 的前 k 件衣物
+        :param mask: 长度为 M 的布尔数组，只在为 True 的行中选取（相似度索引召回的候选行）
+        :return: [(item, total_similarity, {字段: 相似度}), ...]，按分数降序
+        """
+        if self.size == 0 or k <= 0:
+            return []
+        total, similarities = self.score(wishlist_item, weights)
+        return self._select(total, similarities, k, threshold, mask)
+
+    def top_k_many(self, wishlist_items, k, threshold=0.0, weights=None):
+        """对多件心愿单单品分别取前 k 件衣物，每 QUERY_CHUNK_SIZE 件打分一次"""
+        wishlist_items = list(wishlist_items)
+        if self.size == 0 or k <= 0:
+            return [[] for _ in wishlist_items]
+
+        results = []
+        for start in range(0, len(wishlist_items), QUERY_CHUNK_SIZE):
+            chunk = wishlist_items[start:start + QUERY_CHUNK_SIZE]
+            total, similarities = self.score_matrix(chunk, weights)
+            results.extend(
+                self._select(total[q], {field: values[q] for field, values in similarities.items()}, k, threshold)
+                for q in range(len(chunk))
+            )
+        return results
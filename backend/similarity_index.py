@@ -0,0 +1,281 @@
+"""
+按用户常驻内存的相似度索引
+
+首次查询时从数据库加载一次该用户的衣橱，之后由 closet / wishlist 的写接口
+增量维护（upsert / remove）。索引保存整个衣橱的列式特征（similarity.ClosetFeatures，
+写入后惰性重建）以及 (字段, token) -> item_id 的倒排表；单件查询用缓存的特征打分，
+只在与心愿单单品共享 token、颜色组、分类或季节的候选行中取结果。
+
+索引是进程内的：多 worker 部署下其它进程的写入不会推送过来，
+因此每个索引最多存活 INDEX_TTL_SECONDS 秒后整体重建。
+
+文本字段的召回方式由 CANDIDATE_MODE 决定：
+  - exact：按单个字符建倒排，保证召回所有文本相似度非零的衣物；
+    中文常用字（如“色”“衫”）的倒排很长，候选集接近整个衣橱；
+  - lsh：文本字段和颜色按 MinHash LSH 桶建倒排，只召回 n-gram 足够相近的衣物，候选集小得多，
+    只有文本上弱相关、其它字段又不匹配的衣物可能被漏掉（召回率见 scripts/compare_text_similarity.py）。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import attribute_vocab
+import models
+import query_profiles
+import similarity
+
+INDEX_TTL_SECONDS = 300
+MAX_CACHED_USERS = 256
+CANDIDATE_MODES = ('exact', 'lsh')
+CANDIDATE_MODE = 'exact'
+# 倒排 token 类型 -> 打分字段（上界估计用）
+TOKEN_FIELDS = {'color_group': 'color'}
+# 权重相加的浮点误差，上界与阈值比较时放宽
+SCORE_EPSILON = 1e-9
+
+
+class ItemRecord:
+    """衣物快照：打分所需特征 + 相似结果返回所需字段，不再持有 ORM 会话"""
+
+    __slots__ = (
+        'item_id', 'user_id', 'category_id', 'category_name', 'name', 'brand', 'color',
+        'season', 'occasion', 'style', 'image_url', 'price', 'tokens'
+    )
+
+    def __init__(self, item, candidate_mode=None):
+        self.item_id = item.item_id
+        self.user_id = item.user_id
+        self.category_id = item.category_id
+        self.category_name = item.category.category_name if item.category else None
+        self.name = item.name
+        self.brand = item.brand
+        self.color = item.color
+        self.season = item.season
+        self.occasion = item.occasion
+        self.style = item.style
+        self.image_url = item.image_url
+        self.price = item.price
+        self.tokens = record_tokens(self, candidate_mode)
+
+
+def record_tokens(item, candidate_mode=None):
+    """
+    生成倒排 token。文本/颜色相似度非零至少要共享一个字符，
+    颜色组相似（含中文名、色值归一化后的同一种颜色）要共享组位，因此按字符 + 颜色组 + 分类 + 季节建倒排即可保证召回；
+    lsh 模式下文本字段和颜色改用 LSH 桶
+    """
+    use_lsh = (candidate_mode or CANDIDATE_MODE) == 'lsh'
+    tokens = set()
+    for field in similarity.TEXT_FIELDS + ('color',):
+        text = similarity.normalize_text(getattr(item, field))
+        if use_lsh:
+            tokens.update((field, 'lsh', band, key) for band, key in similarity.lsh_bands(text))
+        else:
+            tokens.update((field, ch) for ch in text)
+
+    color = similarity.normalize_text(item.color)
+    mask = attribute_vocab.color_group_mask(color)
+    tokens.update(('color_group', bit) for bit in range(mask.bit_length()) if mask >> bit & 1)
+
+    if item.category_id:
+        tokens.add(('category', item.category_id))
+    if item.season:
+        tokens.add(('season', item.season))
+    return tokens
+
+
+class UserSimilarityIndex:
+    """单个用户的相似度索引"""
+
+    def __init__(self, items, candidate_mode=None):
+        self.candidate_mode = candidate_mode or CANDIDATE_MODE
+        self.records = {}
+        self.postings = {}
+        # 季节单独建表：取值只有少数几种，召回时逐个判断季节得分，不必扫描整个倒排表
+        self.season_postings = {}
+        self.built_at = time.monotonic()
+        self._features = None
+        self._lock = threading.Lock()
+        for item in items:
+            self._add(ItemRecord(item, self.candidate_mode))
+
+    def _postings_for(self, token):
+        if token[0] == 'season':
+            return self.season_postings.setdefault(token[1], set())
+        return self.postings.setdefault(token, set())
+
+    def _add(self, record):
+        self.records[record.item_id] = record
+        for token in record.tokens:
+            self._postings_for(token).add(record.item_id)
+
+    def _remove(self, item_id):
+        record = self.records.pop(item_id, None)
+        if record is None:
+            return
+        for token in record.tokens:
+            table, key = (self.season_postings, token[1]) if token[0] == 'season' else (self.postings, token)
+            ids = table.get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del table[key]
+
+    def upsert(self, item):
+        record = ItemRecord(item, self.candidate_mode)
+        with self._lock:
+            self._remove(record.item_id)
+            self._add(record)
+            self._features = None
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(item_id)
+            self._features = None
+
+    def is_expired(self):
+        return time.monotonic() - self.built_at > INDEX_TTL_SECONDS
+
+    def _current_features(self):
+        # 调用方持有 self._lock
+        if self._features is None:
+            self._features = similarity.ClosetFeatures(self.records.values())
+        return self._features
+
+    def features(self):
+        """整个衣橱的列式特征（写入后惰性重建）"""
+        with self._lock:
+            return self._current_features()
+
+    def _candidate_ids(self, wishlist_item, threshold, weights):
+        """
+        召回候选衣物的 item_id；threshold <= 0 时返回 None（全部衣物）。调用方持有 self._lock
+        不共享任何 token 的衣物只可能在季节上得分，
+        因此只需要召回 季节权重 × 季节相似度 >= threshold 的季节；
+        再按共享 token 的字段估计总分上界（各字段权重之和 + 实际季节得分），上界不到阈值的直接排除
+        """
+        if threshold <= 0:
+            return None
+
+        shared_fields = {}
+        query_tokens = record_tokens(wishlist_item, self.candidate_mode)
+        for token in query_tokens:
+            if token[0] == 'season':
+                continue
+            field = TOKEN_FIELDS.get(token[0], token[0])
+            for item_id in self.postings.get(token, ()):
+                shared_fields.setdefault(item_id, set()).add(field)
+
+        season_weight = weights.get('season', 0)
+        season_scores = {
+            season: season_weight * similarity.season_similarity(wishlist_item.season, season)
+            for season in self.season_postings
+        }
+        for season, score in season_scores.items():
+            if score >= threshold:
+                for item_id in self.season_postings[season]:
+                    shared_fields.setdefault(item_id, set()).add('season')
+
+        candidate_ids = []
+        for item_id, fields in shared_fields.items():
+            record = self.records[item_id]
+            upper_bound = sum(weights.get(field, 0) for field in fields if field != 'season') + \
+                season_scores.get(record.season, 0.0)
+            if upper_bound >= threshold - SCORE_EPSILON:
+                candidate_ids.append(item_id)
+        return candidate_ids
+
+    def candidates(self, wishlist_item, threshold=0.0, weights=None):
+        """召回可能达到阈值的候选衣物（ItemRecord 列表）"""
+        if weights is None:
+            weights = similarity.DEFAULT_WEIGHTS
+        with self._lock:
+            candidate_ids = self._candidate_ids(wishlist_item, threshold, weights)
+            if candidate_ids is None:
+                return list(self.records.values())
+            return [self.records[item_id] for item_id in candidate_ids]
+
+    def top_k(self, wishlist_item, k, threshold=0.0, weights=None):
+        """
+        用缓存的整个衣橱特征打分，只在候选行中取前 k 个
+        特征和候选在同一次加锁中取得，二者对应同一份衣橱快照
+        """
+        if weights is None:
+            weights = similarity.DEFAULT_WEIGHTS
+        with self._lock:
+            features = self._current_features()
+            candidate_ids = self._candidate_ids(wishlist_item, threshold, weights)
+        if features.size == 0 or candidate_ids is not None and not candidate_ids:
+            return []
+        mask = None
+        if candidate_ids is not None and len(candidate_ids) < features.size:
+            mask = np.isin(features.item_ids, np.fromiter(candidate_ids, dtype=np.int64, count=len(candidate_ids)))
+        return features.top_k(wishlist_item, k, threshold, weights, mask)
+
+
+_indexes = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def load_closet(db, user_id):
+    """加载用户全部衣物（分类一并取出，避免逐条懒加载）"""
+    return query_profiles.shaped(db.query(models.ClothingItem), "item_with_category") \
+        .filter(models.ClothingItem.user_id == user_id) \
+        .all()
+
+
+def get_index(db, user_id):
+    """获取用户索引，不存在或已过期时从数据库重建"""
+    with _registry_lock:
+        index = _indexes.get(user_id)
+        if index is not None and not index.is_expired():
+            _indexes.move_to_end(user_id)
+            return index
+
+    index = UserSimilarityIndex(load_closet(db, user_id))
+    with _registry_lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_CACHED_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _registered(user_id):
+    with _registry_lock:
+        return _indexes.get(user_id)
+
+
+def on_item_saved(item):
+    """
+    衣物新增/修改并提交后调用；该用户索引尚未加载时无需处理
+    增量更新失败时丢弃该用户的索引（下次查询重建），不影响已提交的写接口
+    """
+    index = _registered(item.user_id)
+    if index is None:
+        return
+    try:
+        index.upsert(item)
+    except Exception as e:
+        print(f"相似度索引增量更新失败，丢弃用户 {item.user_id} 的索引: {e}")
+        invalidate(item.user_id)
+
+
+def on_item_deleted(user_id, item_id):
+    """衣物删除并提交后调用"""
+    index = _registered(user_id)
+    if index is None:
+        return
+    try:
+        index.remove(item_id)
+    except Exception as e:
+        print(f"相似度索引增量更新失败，丢弃用户 {user_id} 的索引: {e}")
+        invalidate(user_id)
+
+
+def invalidate(user_id):
+    """丢弃某个用户的索引，下次查询时重建"""
+    with _registry_lock:
+        _indexes.pop(user_id, None)
@@ -0,0 +1,172 @@
+"""
+静态资源服务（/static）
+
+默认的 StaticFiles 每次都要经过 CORS / ForceCORSHeaders / metrics 中间件，
+且不带缓存策略，浏览器每次打开衣橱、搭配看板都要重新验证或重新下载全部图片。这里：
+  - StaticBypassMiddleware 放在最外层，/static 请求直接交给静态应用，不经过其它中间件；
+    图片以 crossorigin="anonymous" 加载（画布导出需要），因此静态响应自带
+    Access-Control-Allow-Origin: *（公开资源，不带凭据）；
+  - 内容寻址的文件（SHA-256 命名的上传图片及其缩略图）和带 ?v=<内容哈希> 的 URL
+    返回 Cache-Control: immutable，一年内不再请求；其它文件 no-cache，靠 ETag 304；
+  - 内容寻址文件的 ETag 直接用内容哈希（强校验），If-None-Match 命中返回 304；
+  - Range 请求由 FileResponse 处理；
+  - 存在 .br / .gz 预压缩副本且客户端支持时直接返回副本（`python static_assets.py compress` 生成，
+    brotli 为可选依赖，未安装时只生成 gzip）。
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, PlainTextResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_PREFIX = "/static"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# SHA-256 命名的文件及其缩略图（<sha256>_thumb.webp）
+CONTENT_HASHED_NAME = re.compile(r"^([0-9a-f]{64})[._]")
+VERSION_QUERY = re.compile(r"(^|&)v=[0-9a-f]+(&|$)")
+
+# 值得预压缩的类型（图片本身已压缩，不生成副本）
+COMPRESSIBLE_EXTENSIONS = (".svg", ".json", ".css", ".js", ".txt", ".html")
+# 按偏好顺序：(Accept-Encoding 标记, 副本后缀)
+SIDECAR_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_version_cache = {}
+_version_lock = threading.Lock()
+
+
+def _accepts(request_headers, encoding):
+    accept = request_headers.get("accept-encoding", "")
+    return any(part.split(";")[0].strip() == encoding for part in accept.split(","))
+
+
+class StaticAssets(StaticFiles):
+    """带缓存策略、内容哈希 ETag 与预压缩副本的 StaticFiles"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        name = os.path.basename(full_path)
+        compressible = full_path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+        response = None
+        if compressible and "range" not in request_headers:
+            for encoding, suffix in SIDECAR_ENCODINGS:
+                sidecar = full_path + suffix
+                # 原文件修改后副本已过期，不再使用
+                if _accepts(request_headers, encoding) and os.path.isfile(sidecar) \
+                        and os.stat(sidecar).st_mtime >= stat_result.st_mtime:
+                    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+                    response = FileResponse(sidecar, status_code=status_code, media_type=media_type)
+                    response.headers["content-encoding"] = encoding
+                    break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        hashed = CONTENT_HASHED_NAME.match(name)
+        if hashed:
+            encoding = response.headers.get("content-encoding")
+            response.headers["etag"] = f'"{name}-{encoding}"' if encoding else f'"{name}"'
+        if hashed or VERSION_QUERY.search(scope.get("query_string", b"").decode("latin-1")):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+        if compressible:
+            response.headers["vary"] = "Accept-Encoding"
+        response.headers["access-control-allow-origin"] = "*"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class StaticBypassMiddleware:
+    """最外层中间件：/static 请求直接交给静态应用，跳过 CORS / metrics 等中间件"""
+
+    def __init__(self, app, static_app, prefix=STATIC_PREFIX):
+        self.app = app
+        self.static_app = static_app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.prefix + "/"):
+            scope = {**scope, "root_path": scope.get("root_path", "") + self.prefix}
+            try:
+                await self.static_app(scope, receive, send)
+            except HTTPException as e:
+                # 不经过应用的异常处理中间件，404 / 405 在这里转成响应
+                await PlainTextResponse(e.detail, status_code=e.status_code, headers=e.headers)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def versioned_url(url):
+    """
+    给非内容寻址的静态文件加上 ?v=<内容哈希>，使其也可以 immutable 缓存
+    哈希按 (mtime, size) 缓存，文件变化后自动得到新 URL
+    """
+    if not url or not url.startswith(STATIC_PREFIX + "/") or CONTENT_HASHED_NAME.match(os.path.basename(url)):
+        return url
+    path = os.path.join(BASE_DIR, url.lstrip("/"))
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return url
+    key = (stat_result.st_mtime_ns, stat_result.st_size)
+    with _version_lock:
+        cached = _version_cache.get(path)
+    if cached is None or cached[0] != key:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        cached = (key, digest.hexdigest()[:12])
+        with _version_lock:
+            _version_cache[path] = cached
+    return f"{url}?v={cached[1]}"
+
+
+def compress_sidecars(directory=STATIC_DIR, min_saving=0.1):
+    """为可压缩的静态文件生成 .gz（以及安装了 brotli 时的 .br）副本，返回生成数量"""
+    created = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            outputs = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                outputs.append((".br", brotli.compress(data)))
+            for suffix, compressed in outputs:
+                # 压缩收益太小的不生成
+                if len(compressed) > len(data) * (1 - min_saving):
+                    continue
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                created += 1
+    return created
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["compress"]:
+        count = compress_sidecars()
+        print(f"✅ 已生成 {count} 个预压缩副本{'' if brotli else '（未安装 brotli，仅 gzip）'}")
+    else:
+        print("用法: python static_assets.py compress")
@@ -0,0 +1,52 @@
+"""
+衣物 / 心愿单与标签的关联（closet / wishlist 写接口与批量导入共用）
+
+原来每个 tag_id 先 SELECT 一次确认存在、再 INSERT 一次，更新时整组删除后重插。这里：
+  - 校验 tag_id 使用 reference_data 中缓存的 tags 表，不查库；
+    缓存里没有的 id 再用一条 IN 查询确认（缓存加载之后直接写库新增的标签）；
+  - 与已有关联比较，只删除去掉的标签，新增的标签用一条多行 INSERT 写入。
+不存在的 tag_id 与原来一样直接忽略。
+"""
+from sqlalchemy import select
+
+import models
+import reference_data
+
+# 关联类型 -> (关联表, 外键列名)
+LINK_TABLES = {
+    "clothing": (models.clothing_tags, "item_id"),
+    "wishlist": (models.wishlist_tags, "wishlist_id"),
+}
+
+
+def valid_tag_ids(db, tag_ids):
+    """过滤掉不存在的 tag_id（保持顺序、去重）"""
+    tag_ids = list(dict.fromkeys(tag_ids or []))
+    tags = reference_data.tags_by_id(db)
+    unknown = [tag_id for tag_id in tag_ids if tag_id not in tags]
+    if unknown:
+        found = set(db.execute(select(models.Tag.tag_id).where(models.Tag.tag_id.in_(unknown))).scalars())
+        if found:
+            reference_data.invalidate()
+        return [tag_id for tag_id in tag_ids if tag_id in tags or tag_id in found]
+    return tag_ids
+
+
+def set_tags(db, kind, owner_id, tag_ids, is_new=False):
+    """
+    把某件衣物 / 心愿单项目的标签设置为 tag_ids（不提交）
+    :param kind: "clothing" 或 "wishlist"
+    :param is_new: 刚创建的记录没有旧关联，省去一次查询
+    """
+    table, column = LINK_TABLES[kind]
+    wanted = valid_tag_ids(db, tag_ids)
+    current = set() if is_new else set(
+        db.execute(select(table.c.tag_id).where(table.c[column] == owner_id)).scalars()
+    )
+
+    removed = current.difference(wanted)
+    if removed:
+        db.execute(table.delete().where(table.c[column] == owner_id, table.c.tag_id.in_(removed)))
+    added = [tag_id for tag_id in wanted if tag_id not in current]
+    if added:
+        db.execute(table.insert().values([{column: owner_id, "tag_id": tag_id} for tag_id in added]))
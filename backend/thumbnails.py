@@ -0,0 +1,222 @@
+"""
+单品 / 搭配图片的缩略图与多尺寸版本
+
+衣橱网格、OutfitStudio 侧栏和仪表盘原本都直接加载原图，页面流量几乎全是图片。
+上传成功后在后台线程池里生成 thumb / medium / full 三个尺寸的 WebP
+（Pillow 不支持 WebP 时退回 JPEG），路径由原图路径推导，不需要数据库字段：
+    static/uploads/items/abc.png -> static/uploads/items/variants/abc_thumb.webp
+接口返回 image_variants，某个尺寸尚未生成时回退为原图 URL，前端总能拿到可用地址。
+已有图片（例如 scripts/inject_local.py 注入的）用 `python thumbnails.py` 补生成。
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+import static_assets
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_PREFIX = "/static/"
+# 生成多尺寸版本的目录：上传的单品 / 搭配图片、搭配看板素材（头像不需要）
+VARIANT_SOURCE_DIRS = ("static/uploads/items", "static/uploads/outfits", "static/textures", "static/decor")
+VARIANT_DIR_NAME = "variants"
+
+# 名称 -> 最长边像素（原图更小时不放大）
+VARIANT_SIZES = {
+    "thumb": 200,
+    "medium": 600,
+    "full": 1600,
+}
+VARIANT_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+VARIANT_EXT = ".webp" if VARIANT_FORMAT == "WEBP" else ".jpg"
+VARIANT_QUALITY = 80
+VARIANT_WORKERS = 2
+# 原图写入后这段时间内还没有缩略图，视为正在生成（接口返回的是回退的原图 URL，响应不缓存）
+PENDING_GRACE_SECONDS = 300
+
+_executor = ThreadPoolExecutor(max_workers=VARIANT_WORKERS, thread_name_prefix="thumbnails")
+_pending = set()
+_ready = set()
+_lock = threading.Lock()
+
+
+def _disk_path(url_path):
+    return os.path.join(BASE_DIR, url_path.lstrip("/"))
+
+
+def variant_path(image_url, name):
+    """原图 URL -> 某个尺寸版本的 URL 路径；不是本地上传图片时返回 None"""
+    if not image_url or not image_url.startswith(STATIC_PREFIX):
+        return None
+    directory, filename = os.path.split(image_url)
+    if not any(directory.lstrip("/") == source for source in VARIANT_SOURCE_DIRS):
+        return None
+    stem = os.path.splitext(filename)[0]
+    return f"{directory}/{VARIANT_DIR_NAME}/{stem}_{name}{VARIANT_EXT}"
+
+
+def variants_exist(image_url):
+    """全部尺寸是否已生成（成功结果缓存在内存里，避免每次响应都 stat）"""
+    if image_url in _ready:
+        return True
+    paths = [variant_path(image_url, name) for name in VARIANT_SIZES]
+    if paths[0] is None or not all(os.path.exists(_disk_path(path)) for path in paths):
+        return False
+    _ready.add(image_url)
+    return True
+
+
+def variant_urls(image_url):
+    """
+    返回 {尺寸名: URL}；尚未生成时各尺寸都回退为原图，没有图片时返回 None
+    非内容寻址命名的旧图片带上 ?v=<内容哈希>，同样可以被浏览器长期缓存
+    """
+    if not image_url:
+        return None
+    if not variants_exist(image_url):
+        return {name: static_assets.versioned_url(image_url) for name in VARIANT_SIZES}
+    return {name: static_assets.versioned_url(variant_path(image_url, name)) for name in VARIANT_SIZES}
+
+
+def variants_pending(image_url):
+    """
+    缩略图是否还在生成中：已提交给本进程的线程池，或原图刚写入不久（其它 worker 上传的）
+    没有安排生成的旧图片不算，它们的回退 URL 不会自行变化
+    """
+    if not image_url or variant_path(image_url, "thumb") is None or variants_exist(image_url):
+        return False
+    if image_url in _pending:
+        return True
+    try:
+        return time.time() - os.path.getmtime(_disk_path(image_url)) < PENDING_GRACE_SECONDS
+    except OSError:
+        return False
+
+
+def any_pending(image_urls):
+    """这些图片中是否有缩略图还在生成（读接口据此决定响应能否缓存）"""
+    return any(variants_pending(image_url) for image_url in set(image_urls))
+
+
+def variant_urls_many(image_urls):
+    """批量版 variant_urls：{原图 URL: {尺寸名: URL}}（async 接口放到线程池里调用）"""
+    return {image_url: variant_urls(image_url) for image_url in set(image_urls) if image_url}
+
+
+def attach_variants(records):
+    """
+    给 ORM 对象（衣物 / 搭配）设置 image_variants，返回 records 本身
+    需要检查磁盘上的文件，由接口在序列化之前调用（async 接口放到线程池里），schemas 不做 I/O
+    """
+    for record in records:
+        record.image_variants = variant_urls(record.image_url)
+    return records
+
+
+def _prepare(image):
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if VARIANT_FORMAT == "WEBP":
+        return image.convert("RGBA" if has_alpha else "RGB")
+    if has_alpha:
+        # JPEG 没有透明通道，铺白底
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def generate_variants(image_url, force=False):
+    """生成某张图片的全部尺寸（同步执行），返回是否生成了新文件"""
+    source = _disk_path(image_url)
+    if variant_path(image_url, "thumb") is None or not os.path.exists(source):
+        return False
+    if not force and variants_exist(image_url):
+        return False
+
+    with Image.open(source) as original:
+        original.seek(0)
+        base = _prepare(original)
+
+    # 从大到小依次缩放，后一个尺寸基于前一个的结果，减少重复计算
+    for name, size in sorted(VARIANT_SIZES.items(), key=lambda pair: -pair[1]):
+        base.thumbnail((size, size), Image.LANCZOS)
+        target = _disk_path(variant_path(image_url, name))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                base.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    _ready.add(image_url)
+    return True
+
+
+def _run(image_url):
+    try:
+        generate_variants(image_url)
+    except Exception as e:
+        print(f"生成缩略图失败 {image_url}: {e}")
+    finally:
+        with _lock:
+            _pending.discard(image_url)
+
+
+def schedule(image_url):
+    """提交到后台线程池生成（重复提交会被忽略），不阻塞请求"""
+    if variant_path(image_url, "thumb") is None:
+        return
+    with _lock:
+        if image_url in _pending:
+            return
+        _pending.add(image_url)
+    _executor.submit(_run, image_url)
+
+
+def remove_variants(image_url):
+    """删除原图时一并删除各尺寸版本"""
+    _ready.discard(image_url)
+    for name in VARIANT_SIZES:
+        path = variant_path(image_url, name)
+        if path is not None and os.path.exists(_disk_path(path)):
+            os.remove(_disk_path(path))
+
+
+def backfill(force=False):
+    """为上传目录下已有的全部图片补生成多尺寸版本，返回 (生成数, 跳过数, 失败数)"""
+    image_urls = []
+    for source_dir in VARIANT_SOURCE_DIRS:
+        directory = os.path.join(BASE_DIR, source_dir)
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in (".jpg", ".jpeg", ".png", ".gif", ".webp"):
+                image_urls.append(f"/{source_dir}/{entry.name}")
+
+    generated = skipped = failed = 0
+    futures = {url: _executor.submit(generate_variants, url, force) for url in image_urls}
+    for url, future in futures.items():
+        try:
+            if future.result():
+                generated += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            failed += 1
+            print(f"   [失败] {url}: {e}")
+    return generated, skipped, failed
+
+
+if __name__ == "__main__":
+    generated, skipped, failed = backfill(force="--force" in sys.argv)
+    print(f"✅ 缩略图补生成完成：新生成 {generated}，已存在 {skipped}，失败 {failed}")
@@ -0,0 +1,168 @@
+"""
+图片上传公共流程（单品 / 搭配截图 / 头像共用）
+
+- UploadLimitMiddleware 在解析 multipart 之前按 Content-Length 拒绝超限请求，
+  没有 Content-Length（分块传输）时边接收边计数，超限立即返回 413；
+- save_image 在线程池中按 CHUNK_SIZE 分块拷贝，不阻塞事件循环；
+- 文件类型由开头的魔数判断，不信任文件名后缀和 Content-Type；
+- 先写入同目录下的临时文件，完整写完后 os.replace 原子改名，
+  中途失败只会留下被清理掉的临时文件，不会出现半截图片；
+- 文件名是内容的 SHA-256，重复上传同一张图片只保存一份（引用计数见 file_store.py）。
+"""
+import json
+import os
+import hashlib
+import tempfile
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_AVATAR_BYTES = 2 * 1024 * 1024
+# 衣物批量导入（JSON / NDJSON / CSV）
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+# multipart 边界、表单字段等额外开销
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# 路径前缀 -> 文件大小上限（请求体上限再加上 MULTIPART_OVERHEAD_BYTES）
+UPLOAD_LIMITS = (
+    ("/api/upload/", MAX_IMAGE_BYTES),
+    ("/api/user/", MAX_AVATAR_BYTES),
+    ("/api/closet/items/bulk", MAX_IMPORT_BYTES),
+)
+
+
+def sniff_image_type(head):
+    """根据文件头魔数返回扩展名，不是支持的图片格式时返回 None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def _too_large_detail(max_bytes):
+    return f"文件过大，最大 {max_bytes // (1024 * 1024)}MB"
+
+
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=_too_large_detail(max_bytes))
+
+
+def _copy_to_disk(source, target_dir, max_bytes):
+    """在工作线程中执行：嗅探类型、分块写临时文件并计算 SHA-256、原子改名，返回最终文件名"""
+    head = source.read(CHUNK_SIZE)
+    ext = sniff_image_type(head)
+    if ext is None:
+        raise HTTPException(status_code=415, detail="仅支持 JPG / PNG / GIF / WEBP 图片")
+
+    os.makedirs(target_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=target_dir, suffix=".part")
+    try:
+        written = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as buffer:
+            chunk = head
+            while chunk:
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                buffer.write(chunk)
+                digest.update(chunk)
+                chunk = source.read(CHUNK_SIZE)
+
+        filename = f"{digest.hexdigest()}{ext}"
+        final_path = os.path.join(target_dir, filename)
+        if os.path.exists(final_path):
+            # 相同内容已存在：丢弃临时文件，并刷新 mtime，避免刚归零的旧文件在此刻被回收
+            os.remove(temp_path)
+            os.utime(final_path)
+        else:
+            os.replace(temp_path, final_path)
+        return filename
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+async def save_image(file, target_dir, max_bytes=MAX_IMAGE_BYTES):
+    """
+    保存上传的图片到 target_dir
+    :param file: fastapi.UploadFile
+    :return: 生成的文件名（含扩展名）
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    try:
+        return await run_in_threadpool(_copy_to_disk, file.file, target_dir, max_bytes)
+    finally:
+        await file.close()
+
+
+class UploadLimitMiddleware:
+    """上传接口的请求体大小限制（在 multipart 解析、写临时文件之前生效）"""
+
+    def __init__(self, app, limits=UPLOAD_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    def _limit_for(self, scope):
+        if scope["type"] != "http" or scope.get("method") not in ("POST", "PUT"):
+            return None
+        path = scope.get("path", "")
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit_for(scope)
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await self._reject(send, max_bytes)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large(max_bytes)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await self._reject(send, max_bytes)
+
+    async def _reject(self, send, max_bytes):
+        body = json.dumps({"detail": _too_large_detail(max_bytes)}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,311 @@
+"""
+按用户物化的仪表盘统计（user_stats 表）
+
+Dashboard 每次加载都要对 clothing_items / wishlist_items 做 count、sum(price)、
+按分类 GROUP BY 和最近单品排序。这里把结果物化为每个用户一行：
+  - closet / wishlist 的写接口在同一事务里调用 closet_changed / wishlist_changed，
+    传入修改前后的状态（item_state / wishlist_state），按差值增量更新；
+    统计行用 SELECT ... FOR UPDATE 加锁，同一用户的并发写入依次执行；
+  - 注册时建立统计行，main.py 启动时为旧用户补建（create_missing）；仍缺行时写接口
+    在 SAVEPOINT 里插入，并发插入冲突的一方改为锁住对方已提交的行再做增量；
+  - 最近单品只保存 RECENT_LIMIT 个 item_id，列表中的单品被删除或改了购买日期时重新查询一次；
+  - 读接口 get() 一次主键查询；统计行不存在时现算返回，不写库；
+  - 批量导入等大批量写入直接 rebuild()。
+`python user_stats.py check [--fix]` 与实时聚合结果逐项比对，--fix 时重建不一致的行。
+"""
+import argparse
+import json
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+# 仪表盘展示的最近单品数
+RECENT_LIMIT = 4
+
+
+def item_state(item):
+    """单品影响统计的字段"""
+    return {
+        "item_id": item.item_id,
+        "category_id": item.category_id,
+        "price": float(item.price or 0),
+        "purchase_date": item.purchase_date,
+    }
+
+
+def wishlist_state(item):
+    """心愿单项目影响统计的字段"""
+    return {
+        "category_id": item.category_id,
+        "added": bool(item.added_to_closet),
+    }
+
+
+def _recent_query(db, user_id):
+    # 与原接口一致按购买日期倒序；没有购买日期的排在最后
+    return db.query(models.ClothingItem.item_id) \
+        .filter(models.ClothingItem.user_id == user_id) \
+        .order_by(models.ClothingItem.purchase_date.desc().nulls_last(), models.ClothingItem.item_id.desc()) \
+        .limit(RECENT_LIMIT)
+
+
+def compute(db, user_id):
+    """实时聚合，返回与 user_stats 各列对应的 dict"""
+    item_count, total_price = db.query(
+        func.count(models.ClothingItem.item_id), func.sum(models.ClothingItem.price)
+    ).filter(models.ClothingItem.user_id == user_id).one()
+    category_counts = dict(
+        db.query(models.ClothingItem.category_id, func.count(models.ClothingItem.item_id))
+        .filter(models.ClothingItem.user_id == user_id, models.ClothingItem.category_id.isnot(None))
+        .group_by(models.ClothingItem.category_id)
+        .all()
+    )
+
+    wishlist_rows = db.query(
+        models.WishlistItem.category_id,
+        models.WishlistItem.added_to_closet,
+        func.count(models.WishlistItem.wishlist_id)
+    ).filter(models.WishlistItem.user_id == user_id) \
+        .group_by(models.WishlistItem.category_id, models.WishlistItem.added_to_closet) \
+        .all()
+    wishlist_category_counts = {}
+    wishlist_count = wishlist_added = 0
+    for category_id, added, count in wishlist_rows:
+        wishlist_count += count
+        if added:
+            wishlist_added += count
+        if category_id is not None:
+            wishlist_category_counts[category_id] = wishlist_category_counts.get(category_id, 0) + count
+
+    return {
+        "item_count": item_count or 0,
+        "total_price": round(float(total_price or 0), 2),
+        "category_counts": json.dumps(_dump_counts(category_counts), sort_keys=True),
+        "recent_item_ids": json.dumps([item_id for (item_id,) in _recent_query(db, user_id)]),
+        "wishlist_count": wishlist_count,
+        "wishlist_added": wishlist_added,
+        "wishlist_category_counts": json.dumps(_dump_counts(wishlist_category_counts), sort_keys=True),
+    }
+
+
+def _dump_counts(counts):
+    """{category_id: count} -> JSON 对象（键为字符串，去掉为 0 的分类）"""
+    return {str(category_id): count for category_id, count in counts.items() if count > 0}
+
+
+def _load_counts(text):
+    return {int(category_id): count for category_id, count in json.loads(text or "{}").items()}
+
+
+def _lock(db, user_id):
+    return db.query(models.UserStats).filter(models.UserStats.user_id == user_id).with_for_update().first()
+
+
+def rebuild(db, user_id):
+    """重新计算某个用户的统计行（加锁，不提交）"""
+    db.flush()
+    stats = _lock(db, user_id)
+    if stats is None:
+        if _insert(db, user_id):
+            return db.get(models.UserStats, user_id)
+        stats = _lock(db, user_id)
+    for key, value in compute(db, user_id).items():
+        setattr(stats, key, value)
+    db.flush()
+    return stats
+
+
+def _insert(db, user_id):
+    """
+    按当前数据插入统计行（不提交），返回是否插入成功
+    在 SAVEPOINT 里执行：行已被并发事务插入时只回滚这一步，返回 False
+    """
+    try:
+        with db.begin_nested():
+            db.add(models.UserStats(user_id=user_id, **compute(db, user_id)))
+        return True
+    except IntegrityError:
+        return False
+
+
+def create_missing(db):
+    """为还没有统计行的用户建立统计行并提交（启动时调用，多个 worker 同时执行也没关系）"""
+    user_ids = [
+        uid for (uid,) in db.query(models.User.user_id)
+        .outerjoin(models.UserStats, models.UserStats.user_id == models.User.user_id)
+        .filter(models.UserStats.user_id.is_(None))
+    ]
+    created = sum(_insert(db, uid) for uid in user_ids)
+    db.commit()
+    return created
+
+
+def get(db, user_id):
+    """读取统计行；不存在时现算返回（不加入 session、不写库）"""
+    stats = db.get(models.UserStats, user_id)
+    if stats is None:
+        stats = models.UserStats(user_id=user_id, **compute(db, user_id))
+    return stats
+
+
+def _locked(db, user_id):
+    """
+    加锁读取统计行；不存在时按当前数据（已包含本事务的修改）插入，无需再做增量，返回 None
+    并发事务抢先插入时，它的统计不含本事务未提交的修改，锁住它的行照常做增量
+    """
+    db.flush()
+    stats = _lock(db, user_id)
+    if stats is None:
+        if _insert(db, user_id):
+            return None
+        stats = _lock(db, user_id)
+    return stats
+
+
+def _adjust_counts(text, category_id, delta):
+    counts = _load_counts(text)
+    counts[category_id] = counts.get(category_id, 0) + delta
+    return json.dumps(_dump_counts(counts), sort_keys=True)
+
+
+def _recent_key(state):
+    # 与 _recent_query 的排序一致：有日期的在前、日期新的在前，再按 item_id 倒序
+    purchase_date = state["purchase_date"]
+    return (purchase_date is not None, purchase_date.toordinal() if purchase_date else 0, state["item_id"])
+
+
+def closet_changed(db, user_id, before=None, after=None):
+    """
+    衣物新增（before=None）/ 修改 / 删除（after=None）后、提交前调用
+    before / after 为 item_state() 的结果
+    """
+    stats = _locked(db, user_id)
+    if stats is None:
+        return
+
+    if before is not None:
+        stats.item_count -= 1
+        stats.total_price -= before["price"]
+        if before["category_id"] is not None:
+            stats.category_counts = _adjust_counts(stats.category_counts, before["category_id"], -1)
+    if after is not None:
+        stats.item_count += 1
+        stats.total_price += after["price"]
+        if after["category_id"] is not None:
+            stats.category_counts = _adjust_counts(stats.category_counts, after["category_id"], 1)
+    stats.total_price = round(stats.total_price, 2)
+
+    recent = json.loads(stats.recent_item_ids or "[]")
+    if before is not None and before["item_id"] in recent:
+        # 列表中的单品被删除或修改，补位的单品只能重新查询
+        if after is None or after["purchase_date"] != before["purchase_date"]:
+            stats.recent_item_ids = json.dumps([item_id for (item_id,) in _recent_query(db, user_id)])
+    elif after is not None and (before is None or after["purchase_date"] != before["purchase_date"]):
+        if len(recent) < RECENT_LIMIT:
+            # 列表未满说明全部单品都在里面，重新查询一次即可
+            stats.recent_item_ids = json.dumps([item_id for (item_id,) in _recent_query(db, user_id)])
+        else:
+            last = db.get(models.ClothingItem, recent[-1])
+            if last is None or _recent_key(after) > _recent_key(item_state(last)):
+                stats.recent_item_ids = json.dumps([item_id for (item_id,) in _recent_query(db, user_id)])
+
+
+def wishlist_changed(db, user_id, before=None, after=None):
+    """
+    心愿单项目新增 / 修改（含加入衣橱）/ 删除后、提交前调用
+    before / after 为 wishlist_state() 的结果
+    """
+    stats = _locked(db, user_id)
+    if stats is None:
+        return
+
+    for state, delta in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        stats.wishlist_count += delta
+        if state["added"]:
+            stats.wishlist_added += delta
+        if state["category_id"] is not None:
+            stats.wishlist_category_counts = _adjust_counts(stats.wishlist_category_counts, state["category_id"], delta)
+
+
+def closet_summary(stats):
+    """仪表盘所需的衣橱统计：(单品总数, 总金额, {category_id: 单品数}, 最近单品 ID 列表)"""
+    return (
+        stats.item_count,
+        stats.total_price,
+        _load_counts(stats.category_counts),
+        json.loads(stats.recent_item_ids or "[]"),
+    )
+
+
+def wishlist_summary(stats):
+    """心愿单统计：(总数, 已加入衣橱数, {category_id: 数量})"""
+    return stats.wishlist_count, stats.wishlist_added, _load_counts(stats.wishlist_category_counts)
+
+
+COMPARED_COLUMNS = (
+    "item_count", "total_price", "category_counts", "recent_item_ids",
+    "wishlist_count", "wishlist_added", "wishlist_category_counts",
+)
+
+
+def check(db, user_id=None, fix=False):
+    """
+    校验统计行与实时聚合是否一致
+    :param fix: 是否重建不一致 / 缺失的行（并提交）
+    :return: [(user_id, [不一致的列名])]
+    """
+    user_ids = [user_id] if user_id is not None else [
+        uid for (uid,) in db.query(models.User.user_id).order_by(models.User.user_id)
+    ]
+    mismatches = []
+    for uid in user_ids:
+        stats = db.get(models.UserStats, uid)
+        if stats is None:
+            mismatches.append((uid, ["missing"]))
+        else:
+            expected = compute(db, uid)
+            columns = [
+                column for column in COMPARED_COLUMNS
+                if (round(getattr(stats, column), 2) if column == "total_price" else getattr(stats, column))
+                != expected[column]
+            ]
+            if columns:
+                mismatches.append((uid, columns))
+    if fix and mismatches:
+        for uid, _ in mismatches:
+            rebuild(db, uid)
+        db.commit()
+    return mismatches
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="仪表盘统计（user_stats）校验与重建")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--user", type=int, help="只处理某个用户")
+    parser.add_argument("--fix", action="store_true", help="check 时重建不一致的行")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            user_ids = [args.user] if args.user is not None else [
+                uid for (uid,) in session.query(models.User.user_id)
+            ]
+            for uid in user_ids:
+                rebuild(session, uid)
+            session.commit()
+            print(f"✅ 已重建 {len(user_ids)} 个用户的统计")
+        else:
+            result = check(session, args.user, args.fix)
+            for uid, columns in result:
+                print(f"   [不一致] user_id={uid}: {', '.join(columns)}")
+            suffix = "，已重建" if args.fix and result else ""
+            print(f"✅ 校验完成：{len(result)} 个用户不一致{suffix}")
+    finally:
+        session.close()
@@ -4,6 +4,9 @@
 DROP TABLE IF EXISTS outfit_ref CASCADE;
 DROP TABLE IF EXISTS outfit CASCADE;
 DROP TABLE IF EXISTS clothing_tags CASCADE;
+DROP TABLE IF EXISTS clothing_search_tokens CASCADE;
+DROP TABLE IF EXISTS stored_files CASCADE;
+DROP TABLE IF EXISTS user_stats CASCADE;
 DROP TABLE IF EXISTS clothing_items CASCADE;
 DROP TABLE IF EXISTS tags CASCADE;
 DROP TABLE IF EXISTS categories CASCADE;
@@ -74,6 +77,39 @@ CREATE TABLE clothing_tags (
     UNIQUE(item_id, tag_id)
 );
 
+-- 搜索倒排表：各文本字段的字符 1-gram / 2-gram (替代 LIKE '%kw%' 全表扫描)
+CREATE TABLE clothing_search_tokens (
+    item_id       INT NOT NULL REFERENCES clothing_items(item_id) ON DELETE CASCADE,
+    field         VARCHAR(20) NOT NULL,
+    token         VARCHAR(8) NOT NULL,
+    user_id       INT NOT NULL,
+    weight        SMALLINT NOT NULL DEFAULT 1,
+    PRIMARY KEY (item_id, field, token)
+);
+
+-- 上传文件引用计数：文件按内容 SHA-256 命名去重，引用数归零时才删除文件
+CREATE TABLE stored_files (
+    path          VARCHAR(255) PRIMARY KEY,
+    sha256        VARCHAR(64),
+    size          INT NOT NULL DEFAULT 0,
+    ref_count     INT NOT NULL DEFAULT 0,
+    updated_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 按用户物化的仪表盘统计：注册时建立、由 closet / wishlist 写接口增量维护，
+-- 后端启动时为缺行的用户补建；python user_stats.py check --fix 校验重建
+CREATE TABLE user_stats (
+    user_id                   INT PRIMARY KEY REFERENCES sys_user(user_id) ON DELETE CASCADE,
+    item_count                INT NOT NULL DEFAULT 0,
+    total_price               FLOAT NOT NULL DEFAULT 0,
+    category_counts           TEXT NOT NULL DEFAULT '{}',
+    recent_item_ids           TEXT NOT NULL DEFAULT '[]',
+    wishlist_count            INT NOT NULL DEFAULT 0,
+    wishlist_added            INT NOT NULL DEFAULT 0,
+    wishlist_category_counts  TEXT NOT NULL DEFAULT '{}',
+    updated_at                TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ==========================================
 -- 4. 搭配系统 (Outfit & OutfitRef)
 -- ==========================================
@@ -155,11 +191,17 @@ CREATE INDEX idx_clothing_items_category ON clothing_items(category_id);
 CREATE INDEX idx_clothing_items_user ON clothing_items(user_id);
 CREATE INDEX idx_clothing_items_name ON clothing_items(name);
 CREATE INDEX idx_clothing_tags_item ON clothing_tags(item_id);
+CREATE INDEX idx_search_tokens_lookup ON clothing_search_tokens(user_id, token, item_id);
 CREATE INDEX idx_outfit_user ON outfit(user_id);
 -- 为 wishlist_items 添加索引
 CREATE INDEX idx_wishlist_user ON wishlist_items(user_id);
 CREATE INDEX idx_wishlist_category ON wishlist_items(category_id);
 CREATE INDEX idx_wishlist_added ON wishlist_items(added_to_closet);
+-- 游标分页 (keyset) 使用的复合索引：(用户, 时间, id)
+CREATE INDEX idx_clothing_items_user_created ON clothing_items(user_id, created_at, item_id);
+CREATE INDEX idx_clothing_items_user_category_created ON clothing_items(user_id, category_id, created_at, item_id);
+CREATE INDEX idx_wishlist_user_created ON wishlist_items(user_id, created_at, wishlist_id);
+CREATE INDEX idx_outfit_user_created ON outfit(user_id, create_time, outfit_id);
 
 -- ==========================================
 -- 7. 初始化数据